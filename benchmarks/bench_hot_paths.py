@@ -0,0 +1,79 @@
+'''
+Times the per-frame canvas hot paths in a 10k element scene and the transient memory each frame allocates.
+Runs headless with SDL's dummy video driver:
+    python benchmarks/bench_hot_paths.py
+'''
+
+import os
+import sys
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+# lets the scripts run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from random import random, seed
+import time
+import timeit
+import tracemalloc
+
+import pygame
+from pygame import Vector2
+
+from canvasim.canvas import WorldCanvas, TokenElement
+from canvasim.canvas.edit_tool import SelectTool, DragElementTool, HandTool
+
+ELEMENTS = 10_000
+FRAMES = 100
+CALLS = 20_000
+
+
+def build_scene() -> WorldCanvas:
+    seed(0)
+    canvas = WorldCanvas()
+    canvas.initialize(1280, 720)
+    surf = pygame.Surface((32, 32))
+    for _ in range(ELEMENTS):
+        token = TokenElement(surf)
+        token.transformation.pos = Vector2(random() * 4000, random() * 4000)
+        canvas.add_element(token)
+    return canvas
+
+
+def main() -> None:
+    canvas = build_scene()
+    token = canvas.database.elements[0]
+    select = SelectTool(canvas.viewport)
+    drag = DragElementTool(canvas.viewport, token)
+    hand = HandTool(canvas.viewport)
+    motion = pygame.event.Event(pygame.MOUSEMOTION, pos=(200, 200), rel=(0, 0), buttons=(1, 0, 0))
+
+    calls = {
+        'SelectTool.step': select.step,
+        'DragElementTool.handle_mouse_motion': lambda: drag.handle_mouse_motion(motion),
+        'HandTool.handle_mouse_motion': lambda: hand.handle_mouse_motion(motion),
+        'TokenElement.draw': lambda: token.draw(canvas.win, canvas.world_transform),
+    }
+    for name, call in calls.items():
+        seconds = timeit.timeit(call, number=CALLS)
+        print(f'{name}: {seconds / CALLS * 1e9:.0f} ns')
+
+    canvas.draw()
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        canvas.step()
+        canvas.draw()
+    print(f'frame: {(time.perf_counter() - start) / FRAMES * 1000:.3f} ms')
+
+    tracemalloc.start()
+    transient = 0
+    for _ in range(FRAMES):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        canvas.step()
+        canvas.draw()
+        transient += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    print(f'transient memory per frame: {transient / FRAMES:.0f} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+
+'''
+Headless benchmark suite for the canvas and gui hot paths.
+Builds a parameterised scene, times draw, step, hit-test, layout and event dispatch and writes the results as JSON.
+A stored result can be passed as a baseline, the run fails if any benchmark got slower than the threshold.
+benchmarks/baseline.json holds a run with the default parameters, its environment is recorded in the file,
+record a new one to compare on another machine:
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json --threshold 0.15
+    python benchmarks/bench_suite.py --output benchmarks/baseline.json
+'''
+
+import os
+import sys
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+# lets the scripts run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from random import random, seed
+from statistics import mean, median
+from typing import Callable
+import argparse
+import io
+import json
+import platform
+import time
+
+import pygame
+from pygame import Vector2
+
+from canvasim.canvas import WorldCanvas, TokenElement, RectanglarSurfElement, save_scene, load_scene
+from canvasim.shapes import Polygon
+from canvasim.gui import GuiContext, Label, Button, ToggleButton, Slider, Textbox
+
+WIN_SIZE = (1280, 720)
+WORLD_SIZE = 4000
+
+
+def build_canvas(args: argparse.Namespace) -> WorldCanvas:
+    seed(0)
+    canvas = WorldCanvas()
+    canvas.initialize(*WIN_SIZE)
+
+    if args.background > 0:
+        background = pygame.Surface((args.background, args.background))
+        background.fill((70, 90, 60))
+        canvas.add_element(RectanglarSurfElement(background))
+
+    images = []
+    for i in range(max(1, args.images)):
+        image = pygame.Surface((32, 32), pygame.SRCALPHA)
+        pygame.draw.circle(image, (255, 40 * i % 256, 0, 255), (16, 16), 16)
+        images.append(image)
+    for i in range(args.tokens):
+        token = TokenElement(images[i % len(images)])
+        token.transformation.pos = Vector2(random() * WORLD_SIZE, random() * WORLD_SIZE)
+        canvas.add_element(token)
+
+    for _ in range(args.polygons):
+        center = Vector2(random() * WORLD_SIZE, random() * WORLD_SIZE)
+        points = [center + Vector2(100, 0).rotate(360 * i / args.vertices) for i in range(args.vertices)]
+        canvas.add_element(Polygon((255, 255, 255), points))
+    return canvas
+
+
+def build_layout(widgets: int) -> list[list]:
+    layout = []
+    for i in range(widgets // 2):
+        kind = i % 4
+        if kind == 0:
+            widget = Button(f'button {i}', key=f'button{i}')
+        elif kind == 1:
+            widget = ToggleButton(f'toggle {i}', key=f'toggle{i}')
+        elif kind == 2:
+            widget = Slider(key=f'slider{i}')
+        else:
+            widget = Textbox(f'text {i}', key=f'text{i}')
+        layout.append([Label(f'label {i}:'), widget])
+    return layout
+
+
+def time_call(call: Callable[[], None], repeat: int, setup: Callable[[], None] = None) -> dict[str, float]:
+    '''runs call repeat times after one warmup run, returns timings in milliseconds'''
+    if setup:
+        setup()
+    call()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(samples), 'median_ms': median(samples), 'mean_ms': mean(samples)}
+
+
+def run_canvas(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    canvas = build_canvas(args)
+    results = {}
+
+    results['canvas.draw'] = time_call(canvas.draw, args.repeat)
+    results['canvas.step'] = time_call(canvas.step, args.repeat)
+
+    # zoomed out so the whole scene is visible
+    canvas.world_transform.scale = min(WIN_SIZE) / WORLD_SIZE
+    results['canvas.draw_zoomed_out'] = time_call(canvas.draw, args.repeat)
+    canvas.world_transform.scale = 1.0
+
+    points = [Vector2(random() * WORLD_SIZE, random() * WORLD_SIZE) for _ in range(100)]
+    viewport = canvas.viewport
+    results['viewport.get_handle_at[100]'] = time_call(lambda: [viewport.get_handle_at(p) for p in points], args.repeat)
+    results['viewport.get_element_at[100]'] = time_call(lambda: [viewport.get_element_at(p) for p in points], args.repeat)
+
+    motions = [
+        pygame.event.Event(pygame.MOUSEMOTION, pos=(random() * WIN_SIZE[0], random() * WIN_SIZE[1]), rel=(1, 1), buttons=(0, 0, 0))
+        for _ in range(100)
+    ]
+    def dispatch():
+        for event in motions:
+            canvas.handle_event(event)
+    results['canvas.handle_event[100 motion]'] = time_call(dispatch, args.repeat)
+
+    results['scene.save'] = time_call(lambda: save_scene(canvas.database, io.BytesIO()), args.repeat)
+    buffer = io.BytesIO()
+    save_scene(canvas.database, buffer)
+    data = buffer.getvalue()
+    results['scene.load'] = time_call(lambda: load_scene(io.BytesIO(data)), args.repeat)
+    return results
+
+
+def run_gui(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    win = pygame.display.get_surface()
+    results = {}
+    gui = GuiContext(retained=True)
+
+    layouts = []
+    results['gui.set_layout'] = time_call(
+        lambda: gui.set_layout(layouts.pop()),
+        args.repeat,
+        setup=lambda: layouts.append(build_layout(args.widgets)),
+    )
+
+    motions = [
+        pygame.event.Event(pygame.MOUSEMOTION, pos=(random() * 400, random() * gui.size.y), rel=(1, 1), buttons=(0, 0, 0))
+        for _ in range(100)
+    ]
+    def dispatch():
+        for event in motions:
+            gui.handle_event(event)
+        gui.get_gui_events()
+    results['gui.handle_event[100 motion]'] = time_call(dispatch, args.repeat)
+    results['gui.step'] = time_call(gui.step, args.repeat)
+
+    label = next(element for element in gui.elements if isinstance(element, Label))
+    texts = iter(range(10 ** 9))
+    def relayout():
+        label.update(f'label {next(texts)}:')
+        gui.update_layout()
+    results['gui.relayout[label]'] = time_call(relayout, args.repeat)
+    results['gui.draw'] = time_call(lambda: gui.draw(win), args.repeat)
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    '''prints the change of every benchmark against the baseline, returns the names that regressed'''
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            print(f'{name:40} {timing["min_ms"]:10.3f} ms   (new)')
+            continue
+        # the fastest run is the least disturbed by other processes
+        ratio = timing['min_ms'] / max(baseline[name]['min_ms'], 1e-9)
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:40} {timing["min_ms"]:10.3f} ms   {(ratio - 1) * 100:+7.1f}%{flag}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=10_000, help='number of token elements')
+    parser.add_argument('--images', type=int, default=4, help='distinct token images')
+    parser.add_argument('--polygons', type=int, default=10, help='number of polygons')
+    parser.add_argument('--vertices', type=int, default=1000, help='vertices per polygon')
+    parser.add_argument('--background', type=int, default=4096, help='background image size in pixels, 0 for none')
+    parser.add_argument('--widgets', type=int, default=200, help='number of gui widgets')
+    parser.add_argument('--repeat', type=int, default=30, help='timed runs per benchmark')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results stored in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    results = run_canvas(args)
+    results.update(run_gui(args))
+    pygame.quit()
+
+    report = {
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'threshold')},
+        'environment': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'sdl': '.'.join(map(str, pygame.get_sdl_version())),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if not args.baseline:
+        for name, timing in results.items():
+            print(f'{name:40} {timing["min_ms"]:10.3f} ms')
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get('params') != report['params']:
+        print('warning: baseline was recorded with different parameters')
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,16 @@ from .canvas import WorldCanvas, Element, TokenElement, RectanglarSurfElement, E
 # Shapes
 from .shapes import Polygon, PolygonTool, Rectangle, RectangleTool
 
+# Profiling
+from .profiler import Profiler, profiler
+
 # GUI
-from .gui import GuiContext, GuiStandAlone, Label, Button, ToggleButton, RadioButton, Textbox, Slider, Filler
+from .gui import GuiContext, GuiStandAlone, Label, Button, ToggleButton, RadioButton, Textbox, TextArea, ListView, Slider, Filler
 
 __all__ = [
     "__version__",
     "WorldCanvas", "Element", "TokenElement", "RectanglarSurfElement", "EditTool", "Transformation",
     "Polygon", "PolygonTool", "Rectangle", "RectangleTool",
-    "GuiContext", "GuiStandAlone", "Label", "Button", "ToggleButton", "RadioButton", "Textbox", "Slider", "Filler"
+    "Profiler", "profiler",
+    "GuiContext", "GuiStandAlone", "Label", "Button", "ToggleButton", "RadioButton", "Textbox", "TextArea", "ListView", "Slider", "Filler"
 ]
\ No newline at end of file
@@ -9,5 +9,11 @@ from .world import WorldCanvas
 
 from .transformation import Transformation
 from .edit_tool import EditTool
-from .element import Element, TokenElement, RectanglarSurfElement
-from .handle import Handle
\ No newline at end of file
+from .element import Element, TokenElement, RectanglarSurfElement, Database, Layer
+from .tiled_element import TiledSurfElement, TilePyramid, TileCache
+from .handle import Handle
+from .spatial_index import SpatialIndex, GridIndex, LinearIndex, PointGrid
+from .surface_cache import ScaledSurfaceCache, scaled_surface_cache
+from .workers import WorkerPool, get_worker_pool
+from .assets import AssetManager, default_asset_manager, DisplayFormatConverter, display_converter
+from .scene_io import save_scene, load_scene, SceneReader, SceneFormatError, ElementCodec, register_codec
\ No newline at end of file
@@ -0,0 +1,169 @@
+
+from hashlib import sha1
+import io
+import os
+import weakref
+
+import pygame
+
+from .surface_cache import scaled_surface_cache, surface_bytes
+
+
+def to_display_format(surf: pygame.Surface) -> pygame.Surface:
+    '''returns surf converted to the display pixel format, keeping per-pixel alpha. surf itself when there is no display'''
+    if pygame.display.get_surface() is None:
+        return surf
+    if surf.get_flags() & pygame.SRCALPHA:
+        return surf.convert_alpha()
+    return surf.convert()
+
+
+class DisplayFormatConverter:
+    """Memoized conversion to the display format, a surface shared by many elements is converted once.
+    Surfaces not in the display format are converted by SDL on every blit"""
+    def __init__(self):
+        self._converted: weakref.WeakKeyDictionary[pygame.Surface, pygame.Surface] = weakref.WeakKeyDictionary()
+        self._formats: set[tuple] = None
+
+    def reset(self) -> None:
+        '''forgets conversions and the display format, call after the display mode changes'''
+        self._converted = weakref.WeakKeyDictionary()
+        self._formats = None
+
+    def _get_formats(self) -> set[tuple]:
+        if self._formats is None:
+            display = pygame.display.get_surface()
+            if display is None:
+                return set()
+            alpha = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha()
+            self._formats = {get_format(display), get_format(alpha)}
+        return self._formats
+
+    def is_display_format(self, surf: pygame.Surface) -> bool:
+        return get_format(surf) in self._get_formats()
+
+    def convert(self, surf: pygame.Surface) -> pygame.Surface:
+        '''returns surf in the display format, surf itself if it already is or there is no display'''
+        converted = self._converted.get(surf)
+        if converted is not None:
+            return converted
+        if pygame.display.get_surface() is None or self.is_display_format(surf):
+            return surf
+        converted = to_display_format(surf)
+        self._converted[surf] = converted
+        # scaled copies of the slow surface are never used again
+        scaled_surface_cache.invalidate(surf)
+        return converted
+
+
+def get_format(surf: pygame.Surface) -> tuple:
+    return surf.get_bitsize(), surf.get_masks(), bool(surf.get_flags() & pygame.SRCALPHA)
+
+
+display_converter = DisplayFormatConverter()
+
+
+class AssetManager:
+    """Loads images once per distinct content and hands out shared surfaces.
+    Surfaces are keyed by the hash of the file bytes, so the same image under different paths is stored once.
+    acquire/release keep reference counts, a surface is dropped when its count reaches zero"""
+    def __init__(self, convert: bool = True):
+        self.convert = convert
+        self._paths: dict[str, str] = {}
+        self._surfaces: dict[str, pygame.Surface] = {}
+        self._keys: dict[pygame.Surface, str] = {}
+        self._refcounts: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(surface_bytes(surf) for surf in self._surfaces.values())
+
+    def load(self, path: str) -> pygame.Surface:
+        '''returns the shared surface of the image at path without taking a reference'''
+        path = os.path.abspath(path)
+        key = self._paths.get(path)
+        if key is not None:
+            return self._surfaces[key]
+        with open(path, 'rb') as file:
+            data = file.read()
+        surf = self.load_bytes(data, os.path.basename(path))
+        self._paths[path] = self._keys[surf]
+        return surf
+
+    def load_bytes(self, data: bytes, namehint: str = '') -> pygame.Surface:
+        '''returns the shared surface of an encoded image without taking a reference'''
+        key = sha1(data).hexdigest()
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            return surf
+        surf = pygame.image.load(io.BytesIO(data), namehint)
+        if self.convert:
+            surf = display_converter.convert(surf)
+        self._surfaces[key] = surf
+        self._keys[surf] = key
+        self._refcounts[key] = 0
+        return surf
+
+    def get(self, key: str) -> pygame.Surface:
+        '''returns the surface stored under key, None if there is none'''
+        return self._surfaces.get(key)
+
+    def add(self, key: str, surf: pygame.Surface) -> pygame.Surface:
+        '''stores an already decoded surface under key without taking a reference.
+        Returns the surface already stored under key if there is one'''
+        existing = self._surfaces.get(key)
+        if existing is not None:
+            return existing
+        if self.convert:
+            surf = display_converter.convert(surf)
+        self._surfaces[key] = surf
+        self._keys[surf] = key
+        self._refcounts[key] = 0
+        return surf
+
+    def acquire(self, path: str) -> pygame.Surface:
+        '''loads the image at path and takes a reference to it'''
+        surf = self.load(path)
+        self._refcounts[self._keys[surf]] += 1
+        return surf
+
+    def retain(self, surf: pygame.Surface) -> None:
+        '''takes another reference to a surface handed out by this manager'''
+        self._refcounts[self._keys[surf]] += 1
+
+    def release(self, surf: pygame.Surface) -> None:
+        '''drops a reference, the surface and its scaled copies are freed when none are left'''
+        key = self._keys.get(surf)
+        if key is None:
+            return
+        self._refcounts[key] -= 1
+        if self._refcounts[key] > 0:
+            return
+        del self._surfaces[key]
+        del self._keys[surf]
+        del self._refcounts[key]
+        for path in [path for path, path_key in self._paths.items() if path_key == key]:
+            del self._paths[path]
+        scaled_surface_cache.invalidate(surf)
+
+    def replace(self, surf: pygame.Surface, new_surf: pygame.Surface) -> None:
+        '''swaps a managed surface for a converted copy, the references move with it'''
+        key = self._keys.get(surf)
+        if key is None or new_surf is surf:
+            return
+        del self._keys[surf]
+        self._surfaces[key] = new_surf
+        self._keys[new_surf] = key
+
+    def get_refcount(self, surf: pygame.Surface) -> int:
+        key = self._keys.get(surf)
+        return 0 if key is None else self._refcounts[key]
+
+    def owns(self, surf: pygame.Surface) -> bool:
+        return surf in self._keys
+
+
+default_asset_manager = AssetManager()
@@ -1,29 +1,37 @@
 
+from collections import OrderedDict
+from math import ceil, floor, log2
+
 import pygame
-from pygame import Vector2
 
 from .transformation import Transformation
 from . import world_globals
 
 RULER_BACK_COLOR = (37, 37, 37)
 RULER_TITLE_COLOR = (128, 128, 128)
+RULER_HEIGHT = 16
+GRID_COLOR = (60, 60, 60)
+GRID_COLOR_KEY = (255, 0, 255)
+LABEL_CACHE_SIZE = 512
+# zoom buckets per power of two the grid is rendered for, other scales stretch the bucket below them
+GRID_STEPS_PER_OCTAVE = 16
 
 
 def draw_axis(win: pygame.Surface, world_transform: Transformation) -> None:
-    axis_center = world_transform.transform(Transformation(Vector2(0, 0)))
-    axis_x = world_transform.transform(Transformation(Vector2(100, 0)))
-    axis_y = world_transform.transform(Transformation(Vector2(0, 100)))
+    center_x = -world_transform.pos.x * world_transform.scale
+    center_y = -world_transform.pos.y * world_transform.scale
+    length = 100 * world_transform.scale
 
-    pygame.draw.line(win, (255,0,0), axis_center.pos + Vector2(1, 0), axis_x.pos, 1)
-    pygame.draw.line(win, (0,255,0), axis_center.pos + Vector2(0, 1), axis_y.pos, 1)
+    pygame.draw.line(win, (255,0,0), (center_x + 1, center_y), (center_x + length, center_y), 1)
+    pygame.draw.line(win, (0,255,0), (center_x, center_y + 1), (center_x, center_y + length), 1)
 
 
-def draw_grid(win: pygame.Surface, world_transform: Transformation, base_grid_size: int = 100, draw_ruler: bool=True) -> None:
-    # Adjust grid size based on zoom level
+def get_grid_size(world_transform: Transformation, base_grid_size: int = 100) -> float:
+    '''grid size in world units, doubled or halved so it stays 50-200 pixels on screen'''
     # When zoomed in too much, increase grid size; when zoomed out, decrease it
     grid_size = base_grid_size
     screen_grid_size = grid_size * world_transform.scale
-    
+
     # Keep screen grid size within a reasonable range (e.g., 50-200 pixels)
     while screen_grid_size < 50:
         grid_size *= 2
@@ -31,28 +39,119 @@ def draw_grid(win: pygame.Surface, world_transform: Transformation, base_grid_si
     while screen_grid_size > 200:
         grid_size /= 2
         screen_grid_size = grid_size * world_transform.scale
-    
-    # Calculate visible world bounds
-    top_left_world = world_transform.pos
-    bottom_right_world = world_transform.pos + Vector2(world_globals.win_width, world_globals.win_height) / world_transform.scale
-    
-    # Find the first grid line positions (snap to grid)
-    start_x = (top_left_world.x // grid_size) * grid_size
-    start_y = (top_left_world.y // grid_size) * grid_size
-    
-    # Draw vertical lines
-    x = start_x
-    while x <= bottom_right_world.x:
-        screen_x = (x - world_transform.pos.x) * world_transform.scale
-        pygame.draw.line(win, (60, 60, 60), (screen_x, 0), (screen_x, world_globals.win_height), 1)
-        x += grid_size
-    
-    # Draw horizontal lines
-    y = start_y
-    while y <= bottom_right_world.y:
-        screen_y = (y - world_transform.pos.y) * world_transform.scale
-        pygame.draw.line(win, (60, 60, 60), (0, screen_y), (world_globals.win_width, screen_y), 1)
-        y += grid_size
-
-    # if draw_ruler:
-    #     pygame.draw.rect(win, RULER_BACK_COLOR, ((0, 0), (world_globals.win_width, 16)))
\ No newline at end of file
+    return grid_size
+
+
+def get_zoom_bucket(scale: float) -> float:
+    '''largest bucket scale not above scale, so stretching a bucket never drops a grid line'''
+    return 2 ** (floor(log2(scale) * GRID_STEPS_PER_OCTAVE) / GRID_STEPS_PER_OCTAVE)
+
+
+class GridLayer:
+    """Grid and ruler pre-rendered once per (grid_size, zoom bucket), stretched to the exact scale when zooming
+    and blitted with a modulo offset while panning"""
+    def __init__(self):
+        self._key: tuple = None
+        self._view_key: tuple = None
+        self._bucket_grid: pygame.Surface = None
+        self._bucket_ticks: pygame.Surface = None
+        self._grid_tile: pygame.Surface = None
+        self._ruler_ticks: pygame.Surface = None
+        self._ruler_tile: pygame.Surface = None
+        self._ruler_first_line: int = None
+        self._font: pygame.Font = None
+        self._labels: OrderedDict[str, pygame.Surface] = OrderedDict()
+
+    def _rebuild(self, screen_grid_size: float) -> None:
+        period = ceil(screen_grid_size)
+        width = world_globals.win_width + period + 1
+        height = world_globals.win_height + period + 1
+
+        self._bucket_grid = pygame.Surface((width, height))
+        self._bucket_grid.fill(GRID_COLOR_KEY)
+        self._bucket_grid.set_colorkey(GRID_COLOR_KEY)
+        x = 0.0
+        while x < width:
+            pygame.draw.line(self._bucket_grid, GRID_COLOR, (int(x), 0), (int(x), height), 1)
+            x += screen_grid_size
+        y = 0.0
+        while y < height:
+            pygame.draw.line(self._bucket_grid, GRID_COLOR, (0, int(y)), (width, int(y)), 1)
+            y += screen_grid_size
+
+        self._bucket_ticks = pygame.Surface((width, RULER_HEIGHT))
+        self._bucket_ticks.fill(RULER_BACK_COLOR)
+        x = 0.0
+        while x < width:
+            pygame.draw.line(self._bucket_ticks, RULER_TITLE_COLOR, (int(x), RULER_HEIGHT // 2), (int(x), RULER_HEIGHT), 1)
+            pygame.draw.line(self._bucket_ticks, RULER_TITLE_COLOR, (int(x + screen_grid_size / 2), RULER_HEIGHT * 3 // 4), (int(x + screen_grid_size / 2), RULER_HEIGHT), 1)
+            x += screen_grid_size
+
+    def _stretch(self, ratio: float) -> None:
+        '''maps the bucket tiles to the exact scale, ratio is the exact scale over the bucket scale'''
+        if ratio == 1:
+            self._grid_tile = self._bucket_grid
+            self._ruler_ticks = self._bucket_ticks
+        else:
+            width, height = self._bucket_grid.get_size()
+            size = (ceil(width * ratio), ceil(height * ratio))
+            self._grid_tile = pygame.transform.scale(self._bucket_grid, size)
+            self._ruler_ticks = pygame.transform.scale(self._bucket_ticks, (size[0], RULER_HEIGHT))
+        self._ruler_first_line = None
+
+    def _label_ruler(self, first_line: int, grid_size: float, screen_grid_size: float) -> None:
+        '''redraws the ruler labels, only needed when panning crosses a grid line'''
+        self._ruler_tile = self._ruler_ticks.copy()
+        x = 0.0
+        i = 0
+        while x < self._ruler_tile.get_width():
+            label = self._get_label(f'{(first_line + i) * grid_size:g}')
+            self._ruler_tile.blit(label, (int(x) + 2, 0))
+            x += screen_grid_size
+            i += 1
+        self._ruler_first_line = first_line
+
+    def _get_label(self, text: str) -> pygame.Surface:
+        label = self._labels.get(text)
+        if label is not None:
+            self._labels.move_to_end(text)
+            return label
+        if self._font is None:
+            self._font = pygame.font.SysFont('consolas', 11)
+        label = self._font.render(text, True, RULER_TITLE_COLOR)
+        self._labels[text] = label
+        if len(self._labels) > LABEL_CACHE_SIZE:
+            self._labels.popitem(last=False)
+        return label
+
+    def draw(self, win: pygame.Surface, world_transform: Transformation, base_grid_size: int = 100, draw_ruler: bool = True) -> None:
+        grid_size = get_grid_size(world_transform, base_grid_size)
+        screen_grid_size = grid_size * world_transform.scale
+        bucket = get_zoom_bucket(world_transform.scale)
+        key = (grid_size, bucket, world_globals.win_width, world_globals.win_height)
+        if key != self._key:
+            self._rebuild(grid_size * bucket)
+            self._key = key
+        view_key = (key, world_transform.scale)
+        if view_key != self._view_key:
+            self._stretch(world_transform.scale / bucket)
+            self._view_key = view_key
+
+        # Screen position of the first grid line left of and above the window
+        offset_x = (-world_transform.pos.x * world_transform.scale) % screen_grid_size - screen_grid_size
+        offset_y = (-world_transform.pos.y * world_transform.scale) % screen_grid_size - screen_grid_size
+        win.blit(self._grid_tile, (int(offset_x), int(offset_y)))
+
+        if not draw_ruler:
+            return
+        first_line = round((world_transform.pos.x + offset_x / world_transform.scale) / grid_size)
+        if first_line != self._ruler_first_line:
+            self._label_ruler(first_line, grid_size, screen_grid_size)
+        win.blit(self._ruler_tile, (int(offset_x), 0))
+
+
+grid_layer = GridLayer()
+
+
+def draw_grid(win: pygame.Surface, world_transform: Transformation, base_grid_size: int = 100, draw_ruler: bool=True) -> None:
+    grid_layer.draw(win, world_transform, base_grid_size, draw_ruler)
@@ -16,6 +16,9 @@ class SelectToolMode(Enum):
 
 class EditTool:
     """Base class for editor tools using State pattern"""
+    # tools that need every motion event (e.g. freehand drawing) opt out of per-frame motion coalescing
+    raw_motion = False
+
     def __init__(self, context: Viewport):
         self.viewport = context
 
@@ -47,6 +50,10 @@ class EditTool:
         """Draws tool-specific overlays"""
         ...
 
+    def get_dirty_rects(self, transform: Transformation) -> list[pygame.Rect]:
+        """Returns screen rects covered by this frame's overlays, used by dirty-rect rendering"""
+        return []
+
 class SelectTool(EditTool):
     """Default tool state for hovering and detection handles"""
     def __init__(self, viewport: Viewport):
@@ -54,6 +61,7 @@ class SelectTool(EditTool):
         self.clicked_on_empty_space = False
         self.hovered: Selectable = None
         self.mode = SelectToolMode.HANDLE
+        self._mouse_in_world = Vector2()
 
     def handle_mouse_down(self, event) -> 'EditTool':
         """Determines next tool based on what was clicked"""
@@ -72,7 +80,7 @@ class SelectTool(EditTool):
 
     def step(self):
         """Updates hover detection each frame"""
-        mouse_in_world = self.viewport.world_transform.transform_back(Transformation(Vector2(pygame.mouse.get_pos()))).pos
+        mouse_in_world = self.viewport.world_transform.transform_pos_back_into(pygame.mouse.get_pos(), self._mouse_in_world)
         if self.mode == SelectToolMode.HANDLE:
             self.hovered = self.viewport.get_handle_at(mouse_in_world)
         else:
@@ -82,6 +90,11 @@ class SelectTool(EditTool):
         if self.mode == SelectToolMode.HANDLE and self.hovered:
             self.hovered.draw(win, transform)
 
+    def get_dirty_rects(self, transform: Transformation) -> list[pygame.Rect]:
+        if self.mode == SelectToolMode.HANDLE and self.hovered:
+            return [self.hovered.get_screen_rect(transform)]
+        return []
+
 
 
 class DragElementTool(EditTool):
@@ -91,12 +104,14 @@ class DragElementTool(EditTool):
         self.main_element = main_element
         mouse_pos = self.viewport.world_transform.transform_back(Transformation(Vector2(pygame.mouse.get_pos())))
         self.drag_offset = mouse_pos.pos - self.main_element.transformation.pos
+        self._pos = Vector2()
 
     def handle_mouse_motion(self, event):
         """Updates positions maintaining relative offsets"""
-        pos = self.viewport.world_transform.transform_back(Transformation(Vector2(event.pos))).pos
+        pos = self.viewport.world_transform.transform_pos_back_into(event.pos, self._pos)
+        pos -= self.drag_offset
 
-        self.main_element.transformation.pos = Vector2(pos - self.drag_offset)
+        self.main_element.set_pos(pos)
         return self
 
     def handle_mouse_up(self, event):
@@ -111,7 +126,9 @@ class HandTool(EditTool):
 
     def handle_mouse_motion(self, event):
         """Pans the canvas"""
-        self.viewport.world_transform.pos -= Vector2(event.rel) * 1 / self.viewport.world_transform.scale
+        world_transform = self.viewport.world_transform
+        world_transform.pos.x -= event.rel[0] / world_transform.scale
+        world_transform.pos.y -= event.rel[1] / world_transform.scale
         return self
 
     def handle_mouse_up(self, event):
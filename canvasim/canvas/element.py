@@ -1,5 +1,6 @@
 
 from dataclasses import dataclass, field
+from typing import Callable
 
 import pygame
 from pygame import Vector2
@@ -7,13 +8,36 @@ from pygame import Vector2
 from .transformation import Transformation
 from . import world_globals
 from .handle import Handle
+from .spatial_index import SpatialIndex, GridIndex
+from .surface_cache import ScaledSurfaceCache, scaled_surface_cache
+from .workers import WorkerPool, PanTracker, get_worker_pool
+from .assets import AssetManager, default_asset_manager
+from ..profiler import profiler
 
 
 
 class Element:
+    __slots__ = ('transformation', 'handles', 'database')
+    # sprite-like elements draw as a single blit and implement get_blit so layers can batch them.
+    # get_blit must match draw, subclasses overriding draw are not batched unless they set is_sprite again
+    is_sprite = False
+    # dynamic elements are stepped every simulation tick and drawn interpolated between ticks
+    is_dynamic = False
+    # elements with many handles keep them out of the handle index, the database asks them through query_handles.
+    # their handles lie inside their world bounds and have a radius of at most handle_radius
+    lazy_handles = False
+    handle_radius = 0.0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # a subclass overriding draw is drawn through it, unless it opts in to batching again by setting is_sprite itself
+        if 'draw' in cls.__dict__ and 'is_sprite' not in cls.__dict__:
+            cls.is_sprite = False
+
     def __init__(self):
         self.transformation = Transformation(Vector2())
         self.handles: list[Handle] = []
+        self.database: 'Database' = None
     
     def draw(self, win: pygame.Surface, transform: Transformation) -> None:
         ...
@@ -21,53 +45,518 @@ class Element:
     def hit_test(self, world_pos: Vector2) -> bool:
         ...
 
+    def get_world_bounds(self) -> pygame.FRect:
+        """Returns the world-space bounding rect of the element, None if unbounded"""
+        return None
+
+    def step(self, dt: float) -> None:
+        """Advances a dynamic element by dt seconds of simulation time"""
+        ...
+
+    def get_blit(self, world_transform: Transformation) -> tuple[pygame.Surface, tuple[float, float]]:
+        """Returns the (surface, position) pair of a sprite-like element, None if there is nothing to draw"""
+        return None
+
+    def query_handles(self, rect: pygame.FRect) -> list[Handle]:
+        """Returns the handles positioned inside rect, used for elements with lazy_handles"""
+        return []
+
+    def set_pos(self, pos: Vector2) -> None:
+        self.transformation.pos.update(pos)
+        self.moved()
+
+    def add_handle(self, handle: Handle) -> None:
+        handle.index = len(self.handles)
+        self.handles.append(handle)
+        if self.database is not None:
+            self.database.index_handle(handle)
+            self.database.index_element(self)
+
+    def moved(self) -> None:
+        """Notifies the database after the element transformation was changed in place"""
+        if self.database is not None:
+            if not self.lazy_handles:
+                for handle in self.handles:
+                    self.database.index_handle(handle)
+            self.database.index_element(self)
+
+    def on_handle_moved(self, handle: Handle) -> None:
+        if self.database is not None:
+            self.database.index_handle(handle)
+            self.database.index_element(self)
+
+    def get_handle_index(self, handle: Handle) -> int:
+        return handle.index
+
+    def mark_dirty(self) -> None:
+        """Notifies the database that the element appearance changed"""
+        if self.database is not None:
+            self.database.index_element(self)
+
+    def removed(self) -> None:
+        """Called by the database after the element was removed, release shared resources here"""
+        ...
+
+    def get_surfaces(self) -> list[pygame.Surface]:
+        """Returns the source surfaces the element blits, used to check their pixel format"""
+        return []
+
+    def convert_surfaces(self, convert: Callable[[pygame.Surface], pygame.Surface]) -> None:
+        """Replaces the element surfaces with convert(surface), used to switch to the display format"""
+        ...
+
+
+
+DEFAULT_LAYER = 'default'
+# sprites submitted per blit call, bounds the blit pairs held alive at once
+BLIT_BATCH_SIZE = 32
+# damage rects kept between two collections, past it everything counts as changed
+# so a database nobody draws does not grow its damage list forever
+MAX_DAMAGE_RECTS = 1024
+
+
+def blit_batch(win: pygame.Surface, batch: list[tuple[pygame.Surface, tuple[float, float]]]) -> None:
+    '''submits (surface, position) pairs in a single call'''
+    profiler.count('blit_batches')
+    profiler.count('blits_issued', len(batch))
+    if hasattr(win, 'fblits'):
+        win.fblits(batch)
+    else:
+        win.blits(batch, doreturn=False)
+
+
+@dataclass
+class Layer:
+    """Named group of elements drawn together. A cached layer renders into an offscreen surface
+    that is reused until one of its elements changes or the view moves"""
+    name: str
+    cached: bool = False
+    elements: list[Element] = field(default_factory=list)
+    _surf: pygame.Surface = field(default=None, init=False, repr=False)
+    _view: tuple = field(default=None, init=False, repr=False)
+    _dirty: bool = field(default=True, init=False, repr=False)
+    # set by the database owning the layer, its element index provides the visible elements
+    _database: 'Database' = field(default=None, init=False, repr=False)
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def get_visible_elements(self, visible_rect: pygame.FRect) -> list[Element]:
+        '''elements that may intersect visible_rect in draw order, checks every element bounds only when the layer is not in a database'''
+        if self._database is not None:
+            return self._database.query_layer_rect(self, visible_rect)
+        visible = []
+        for element in self.elements:
+            bounds = element.get_world_bounds()
+            if bounds is None or visible_rect.colliderect(bounds):
+                visible.append(element)
+        return visible
+
+    def draw_elements(self, win: pygame.Surface, world_transform: Transformation, visible_rect: pygame.FRect) -> None:
+        # consecutive sprites are submitted in one call, other elements flush the batch to keep draw order
+        batch: list[tuple[pygame.Surface, tuple[float, float]]] = []
+        visible = self.get_visible_elements(visible_rect)
+        for element in visible:
+            if element.is_sprite:
+                blit = element.get_blit(world_transform)
+                if blit is not None:
+                    batch.append(blit)
+                    if len(batch) == BLIT_BATCH_SIZE:
+                        blit_batch(win, batch)
+                        batch.clear()
+                continue
+            if batch:
+                blit_batch(win, batch)
+                batch.clear()
+            element.draw(win, world_transform)
+        if batch:
+            blit_batch(win, batch)
+        profiler.count('elements_drawn', len(visible))
+
+    def draw(self, win: pygame.Surface, world_transform: Transformation, visible_rect: pygame.FRect) -> None:
+        if not self.cached:
+            self.draw_elements(win, world_transform, visible_rect)
+            return
+
+        view = (Vector2(world_transform.pos), world_transform.scale, win.get_size())
+        if self._dirty or view != self._view:
+            if self._surf is None or self._surf.get_size() != win.get_size():
+                self._surf = pygame.Surface(win.get_size(), pygame.SRCALPHA)
+            self._surf.fill((0, 0, 0, 0))
+            # cleared first so elements invalidating while drawing are redrawn next frame
+            self._dirty = False
+            self._view = view
+            full_rect = pygame.FRect(world_transform.pos, Vector2(win.get_size()) / world_transform.scale)
+            self.draw_elements(self._surf, world_transform, full_rect)
+        win.blit(self._surf, (0, 0))
 
 
 @dataclass
 class Database:
+    """Elements of the world grouped into layers, drawn bottom to top. Keeps the spatial indices
+    and the damaged regions up to date as elements are added, moved and removed"""
     elements: list[Element] = field(default_factory=list)
+    handle_index: SpatialIndex = field(default_factory=GridIndex)
+    element_index: SpatialIndex = field(default_factory=lambda: GridIndex(512))
+    layers: dict[str, Layer] = field(default_factory=lambda: {DEFAULT_LAYER: Layer(DEFAULT_LAYER)})
+    _order: dict[Element, int] = field(default_factory=dict, init=False, repr=False)
+    _next_order: int = field(default=0, init=False, repr=False)
+    _element_layers: dict[Element, Layer] = field(default_factory=dict, init=False, repr=False)
+    _layer_rank: dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    _unbounded: dict[Element, None] = field(default_factory=dict, init=False, repr=False)
+    _bounds: dict[Element, pygame.FRect] = field(default_factory=dict, init=False, repr=False)
+    _damage: list[pygame.FRect] = field(default_factory=list, init=False, repr=False)
+    _damage_all: bool = field(default=False, init=False, repr=False)
+    dynamic_elements: dict[Element, None] = field(default_factory=dict, init=False, repr=False)
+    # visible elements grouped by layer for the last queried rect, dropped whenever the element index changes
+    _visible_key: tuple = field(default=None, init=False, repr=False)
+    _visible: dict[str, list[Element]] = field(default=None, init=False, repr=False)
+    # scene positions of the elements moved for the current frame only
+    _frame_positions: dict[Element, Vector2] = field(default_factory=dict, init=False, repr=False)
+    # largest handle radius of the elements with lazy handles, their bounds are searched this much around a query
+    _lazy_handle_radius: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self):
+        for layer in self.layers.values():
+            layer._database = self
+        self._rank_layers()
+        elements = self.elements
+        self.elements = []
+        for element in elements:
+            self.add_element(element)
+
+    def _rank_layers(self) -> None:
+        self._layer_rank = {name: rank for rank, name in enumerate(self.layers)}
+
+    def add_layer(self, name: str, cached: bool = False, below: str = None) -> Layer:
+        """Adds a layer on top, or right below an existing layer, raises KeyError when below is not a layer"""
+        if name in self.layers:
+            return self.layers[name]
+        if below is not None and below not in self.layers:
+            raise KeyError(f'no layer named {below!r}')
+        layer = Layer(name, cached)
+        layer._database = self
+        if below is None:
+            self.layers[name] = layer
+        else:
+            layers = {}
+            for other_name, other in self.layers.items():
+                if other_name == below:
+                    layers[name] = layer
+                layers[other_name] = other
+            self.layers = layers
+        self._rank_layers()
+        self._damage_all = True
+        return layer
+
+    def get_layer(self, element: Element) -> Layer:
+        return self._element_layers.get(element)
+
+    def add_element(self, element: Element, layer: str = DEFAULT_LAYER) -> None:
+        if layer not in self.layers:
+            self.add_layer(layer)
+        self.elements.append(element)
+        self.layers[layer].elements.append(element)
+        self._register(element, self.layers[layer])
+        self.index_element(element)
+
+    def add_elements(self, elements: list[Element], layer: str = DEFAULT_LAYER) -> None:
+        """Adds many new elements at once, the whole view is damaged once instead of once per element"""
+        if layer not in self.layers:
+            self.add_layer(layer)
+        target = self.layers[layer]
+        self.elements.extend(elements)
+        target.elements.extend(elements)
+        target.invalidate()
+        for element in elements:
+            self._register(element, target)
+            self._index_bounds(element)
+        self._damage_all = True
+        self._damage = []
+
+    def _register(self, element: Element, layer: Layer) -> None:
+        '''links a new element to the database and indexes its handles, its bounds are left to the caller'''
+        self._element_layers[element] = layer
+        self._order[element] = self._next_order
+        self._next_order += 1
+        if element.is_dynamic:
+            self.dynamic_elements[element] = None
+        element.database = self
+        if element.lazy_handles:
+            self._lazy_handle_radius = max(self._lazy_handle_radius, element.handle_radius)
+        else:
+            for handle in element.handles:
+                self.index_handle(handle)
+
+    def remove_element(self, element: Element) -> None:
+        self.elements.remove(element)
+        layer = self._element_layers.pop(element)
+        layer.elements.remove(element)
+        layer.invalidate()
+        self._order.pop(element, None)
+        self.dynamic_elements.pop(element, None)
+        element.database = None
+        if not element.lazy_handles:
+            for handle in element.handles:
+                self.handle_index.remove(handle)
+        self.element_index.remove(element)
+        self._unbounded.pop(element, None)
+        self._add_damage(self._bounds.pop(element, None))
+        self._visible = None
+        element.removed()
+
+    def index_handle(self, handle: Handle) -> None:
+        pos = handle.pos
+        radius = handle.radius
+        self.handle_index.update(handle, pygame.FRect(pos.x - radius, pos.y - radius, radius * 2, radius * 2))
+
+    def index_element(self, element: Element) -> None:
+        self._element_layers[element].invalidate()
+        self._add_damage(self._bounds.get(element))
+        bounds = self._index_bounds(element)
+        if bounds is None:
+            self._damage_all = True
+        else:
+            self._add_damage(bounds)
+
+    def _index_bounds(self, element: Element) -> pygame.FRect:
+        '''updates the element index with the current element bounds without recording damage, returns the bounds'''
+        self._visible = None
+        bounds = element.get_world_bounds()
+        if bounds is None:
+            self.element_index.remove(element)
+            self._unbounded[element] = None
+            self._bounds.pop(element, None)
+        else:
+            self._unbounded.pop(element, None)
+            self.element_index.update(element, bounds)
+            self._bounds[element] = pygame.FRect(bounds)
+        return bounds
+
+    def move_for_frame(self, element: Element, pos: Vector2) -> None:
+        """Draws element at pos for the current frame only, restore_frame_positions moves it back to its scene position.
+        Its cached layer is redrawn, and the index covers both positions so the element is not culled"""
+        element_pos = element.transformation.pos
+        if element not in self._frame_positions:
+            self._frame_positions[element] = Vector2(element_pos)
+        element_pos.update(pos)
+        self._element_layers[element].invalidate()
+        self._visible = None
+        bounds = element.get_world_bounds()
+        if bounds is None:
+            self._damage_all = True
+            return
+        scene_bounds = self._bounds.get(element)
+        if scene_bounds is not None:
+            # the element may have been drawn at its scene position last frame
+            bounds = bounds.union(scene_bounds)
+            self.element_index.update(element, bounds)
+            self._bounds[element] = bounds
+        self._add_damage(bounds)
+
+    def restore_frame_positions(self) -> None:
+        """Moves the elements given to move_for_frame back to their scene position after the frame was drawn"""
+        for element, pos in self._frame_positions.items():
+            if element.database is not self:
+                continue
+            # the frame position is repainted next frame
+            self._add_damage(element.get_world_bounds())
+            element.transformation.pos.update(pos)
+            if element in self._bounds:
+                bounds = element.get_world_bounds()
+                self.element_index.update(element, bounds)
+                self._bounds[element] = pygame.FRect(bounds)
+        if self._frame_positions:
+            self._frame_positions = {}
+            self._visible = None
+
+    def _add_damage(self, bounds: pygame.FRect) -> None:
+        if bounds is None or self._damage_all:
+            return
+        if len(self._damage) >= MAX_DAMAGE_RECTS:
+            self._damage_all = True
+            self._damage = []
+            return
+        self._damage.append(pygame.FRect(bounds))
+
+    def collect_damage(self) -> list[pygame.FRect]:
+        """Returns and clears world-space regions changed since the last call, None if everything changed"""
+        damage = None if self._damage_all else self._damage
+        self._damage = []
+        self._damage_all = False
+        return damage
+
+    def query_handles(self, world_pos: Vector2, radius: float = 0.0) -> list[Handle]:
+        """Returns handles within radius of world_pos, top-most first"""
+        rect = pygame.FRect(world_pos.x - radius, world_pos.y - radius, radius * 2, radius * 2)
+        handles = self.handle_index.query_rect(rect)
+        if self._lazy_handle_radius:
+            margin = self._lazy_handle_radius
+            search_rect = rect.inflate(margin * 2, margin * 2)
+            for element in self.element_index.query_rect(search_rect):
+                if element.lazy_handles:
+                    handles.extend(element.query_handles(search_rect))
+        handles = [handle for handle in handles if world_pos.distance_to(handle.pos) < handle.radius + radius]
+        if len(handles) > 1:
+            handles.sort(key=lambda handle: (self._draw_order(handle.owner), -handle.owner.get_handle_index(handle)), reverse=True)
+        return handles
+
+    def query_elements(self, world_pos: Vector2) -> list[Element]:
+        """Returns elements whose bounds may contain world_pos, top-most first"""
+        elements = self.element_index.query_point(world_pos)
+        elements.extend(self._unbounded)
+        elements.sort(key=self._draw_order, reverse=True)
+        return elements
+
+    def query_layer_rect(self, layer: Layer, rect: pygame.FRect) -> list[Element]:
+        """Returns the elements of layer whose bounds intersect rect and its unbounded elements, in draw order"""
+        key = (rect.x, rect.y, rect.w, rect.h)
+        if self._visible is None or key != self._visible_key:
+            # every layer draws with the same rect, so the index is queried once for all of them
+            bounds = self._bounds
+            element_layers = self._element_layers
+            visible: dict[str, list[Element]] = {}
+            for element in self.element_index.query_rect(rect):
+                if rect.colliderect(bounds[element]):
+                    visible.setdefault(element_layers[element].name, []).append(element)
+            for element in self._unbounded:
+                visible.setdefault(element_layers[element].name, []).append(element)
+            for elements in visible.values():
+                elements.sort(key=self._order.__getitem__)
+            self._visible = visible
+            self._visible_key = key
+        return self._visible.get(layer.name, [])
+
+    def _draw_order(self, element: Element) -> tuple[int, int]:
+        return self._layer_rank[self._element_layers[element].name], self._order[element]
 
 
 class TokenElement(Element):
+    __slots__ = ('surf', 'assets')
+    is_sprite = True
+    surface_cache: ScaledSurfaceCache = scaled_surface_cache
+
     def __init__(self, surf: pygame.Surface):
         super().__init__()
         self.surf = surf
-        self.handles.append(Handle(self.transformation, max(*self.surf.get_size()) / 2, self))
+        # set when surf is a shared asset, the reference is released on removal
+        self.assets: AssetManager = None
+        self.add_handle(Handle(self.transformation, max(*self.surf.get_size()) / 2, self))
+
+    @classmethod
+    def from_asset(cls, path: str, assets: AssetManager = None) -> 'TokenElement':
+        '''creates a token sharing the image at path with every other token loaded from the same content'''
+        if assets is None:
+            assets = default_asset_manager
+        element = cls(assets.acquire(path))
+        element.assets = assets
+        return element
+
+    def removed(self) -> None:
+        if self.assets is not None:
+            self.assets.release(self.surf)
+            self.assets = None
+
+    def get_surfaces(self) -> list[pygame.Surface]:
+        return [self.surf]
+
+    def convert_surfaces(self, convert: Callable[[pygame.Surface], pygame.Surface]) -> None:
+        surf = convert(self.surf)
+        if surf is self.surf:
+            return
+        if self.assets is not None:
+            self.assets.replace(self.surf, surf)
+        self.surf = surf
+        self.mark_dirty()
     
     def hit_test(self, world_pos):
         return self.handles[0].hit_test(world_pos)
 
-    def draw(self, win: pygame.Surface, world_transform: Transformation) -> None:
-        # Combine element's transform with world transform
-        screen_transform = world_transform.transform(self.transformation)
-        
-        # Calculate scaled size
-        surf_width, surf_height = self.surf.get_size()
-        scaled_width = int(surf_width * screen_transform.scale)
-        scaled_height = int(surf_height * screen_transform.scale)
-        
-        if scaled_width <= 0 or scaled_height <= 0:
-            return
-        
-        # Scale the surface
-        scaled_surf = pygame.transform.scale(self.surf, (scaled_width, scaled_height))
+    def get_world_bounds(self) -> pygame.FRect:
+        width, height = self.surf.get_size()
+        # drawn at the quantized scale of the surface cache, which can be larger than the exact one
+        scale = self.transformation.scale * self.surface_cache.get_max_scale_error()
+        bounds = pygame.FRect(0, 0, width * scale, height * scale)
+        bounds.center = self.transformation.pos
+        return bounds
+
+    def get_blit(self, world_transform: Transformation) -> tuple[pygame.Surface, tuple[float, float]]:
+        # Combine element's transform with world transform, inlined to avoid temporaries
+        scale = world_transform.scale * self.transformation.scale
         
-        # Draw centered on the position
-        draw_pos = screen_transform.pos - Vector2(scaled_width / 2, scaled_height / 2)
+        # Scaled surfaces are shared between tokens with the same image and zoom
+        scaled_surf = self.surface_cache.get(self.surf, scale)
+        if scaled_surf is None:
+            return None
         
-        win.blit(scaled_surf, draw_pos)
+        # Centered on the position
+        pos = self.transformation.pos
+        draw_x = (pos[0] - world_transform.pos[0]) * world_transform.scale - scaled_surf.get_width() / 2
+        draw_y = (pos[1] - world_transform.pos[1]) * world_transform.scale - scaled_surf.get_height() / 2
+        return scaled_surf, (draw_x, draw_y)
+
+    def draw(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        blit = self.get_blit(world_transform)
+        if blit is not None:
+            win.blit(*blit)
+            profiler.count('blits_issued')
         # for handle in self.handles:
         #     handle.draw(win, world_transform)
 
 
 class RectanglarSurfElement(Element):
-    def __init__(self, surf: pygame.Surface):
+    __slots__ = (
+        'surf', '_cached_surf', '_cached_draw_pos', '_cached_world_transform',
+        'async_rescale', 'worker_pool', '_pan_tracker', 'assets', '_stretched',
+    )
+
+    def __init__(self, surf: pygame.Surface, async_rescale: bool = False, worker_pool: WorkerPool = None):
         super().__init__()
         self.surf = surf
+        # set when surf is a shared asset, the reference is released on removal
+        self.assets: AssetManager = None
         # Cache
         self._cached_surf: pygame.Surface = None
         self._cached_draw_pos: Vector2 = None
         self._cached_world_transform: Transformation = None
+        # Background rescaling, the last cached surface is stretched until the new one is ready
+        self.async_rescale = async_rescale
+        self.worker_pool = worker_pool
+        self._pan_tracker = PanTracker()
+        # (cached surface, target scale, source rect, stretched surface) reused while the view keeps its scale
+        self._stretched: tuple = None
+
+    @classmethod
+    def from_asset(cls, path: str, assets: AssetManager = None, **kwargs) -> 'RectanglarSurfElement':
+        '''creates the element from a shared image, kwargs are passed to the constructor'''
+        if assets is None:
+            assets = default_asset_manager
+        element = cls(assets.acquire(path), **kwargs)
+        element.assets = assets
+        return element
+
+    def removed(self) -> None:
+        if self.assets is not None:
+            self.assets.release(self.surf)
+            self.assets = None
+
+    def get_surfaces(self) -> list[pygame.Surface]:
+        return [self.surf]
+
+    def convert_surfaces(self, convert: Callable[[pygame.Surface], pygame.Surface]) -> None:
+        surf = convert(self.surf)
+        if surf is self.surf:
+            return
+        if self.assets is not None:
+            self.assets.replace(self.surf, surf)
+        self.surf = surf
+        self._cached_surf = None
+        self._cached_world_transform = None
+        self._stretched = None
+        self.mark_dirty()
+
+    def get_world_bounds(self) -> pygame.FRect:
+        return pygame.FRect(self.transformation.pos, self.surf.get_size())
 
     def _needs_recalculation(self, world_transform: Transformation) -> bool:
         """Check if the cached surface needs to be recalculated."""
@@ -76,11 +565,14 @@ class RectanglarSurfElement(Element):
         return (self._cached_world_transform.pos != world_transform.pos or
                 self._cached_world_transform.scale != world_transform.scale)
 
-    def _calculate_visible_region(self, world_transform: Transformation) -> tuple:
+    def _calculate_visible_region(self, world_transform: Transformation, view_rect: pygame.Rect = None) -> tuple:
         """
         Calculate the visible region of the surface.
         Returns (src_rect, dest_size, draw_pos) or None if nothing is visible.
+        view_rect is the screen region to cover, the whole window by default.
         """
+        if view_rect is None:
+            view_rect = pygame.Rect(0, 0, world_globals.win_width, world_globals.win_height)
         elem_world_pos = self.transformation.pos
         surf_width, surf_height = self.surf.get_size()
         
@@ -92,10 +584,10 @@ class RectanglarSurfElement(Element):
         scaled_height = surf_height * world_transform.scale
         
         # Calculate visible region in screen coordinates
-        visible_left = max(0, -screen_pos.x)
-        visible_top = max(0, -screen_pos.y)
-        visible_right = min(scaled_width, world_globals.win_width - screen_pos.x)
-        visible_bottom = min(scaled_height, world_globals.win_height - screen_pos.y)
+        visible_left = max(0, view_rect.left - screen_pos.x)
+        visible_top = max(0, view_rect.top - screen_pos.y)
+        visible_right = min(scaled_width, view_rect.right - screen_pos.x)
+        visible_bottom = min(scaled_height, view_rect.bottom - screen_pos.y)
         
         # Check if any part is visible
         if visible_left >= visible_right or visible_top >= visible_bottom:
@@ -147,17 +639,100 @@ class RectanglarSurfElement(Element):
         src_rect, dest_size, draw_pos = result
         
         # Extract and scale the visible portion
-        visible_subsurface = self.surf.subsurface(src_rect)
-        self._cached_surf = pygame.transform.scale(visible_subsurface, dest_size)
+        self._cached_surf = scale_region(self.surf, src_rect, dest_size)
+        profiler.count('surfaces_scaled')
         self._cached_draw_pos = draw_pos
         self._cached_world_transform = Transformation(Vector2(world_transform.pos), world_transform.scale)
         
         return True
 
+    def _request_cache(self, world_transform: Transformation) -> None:
+        """Queue a background rescale of the visible region, extended in the panning direction."""
+        view_rect = pygame.Rect(0, 0, world_globals.win_width, world_globals.win_height)
+        result = self._calculate_visible_region(world_transform, self._pan_tracker.get_prefetch_rect(view_rect))
+        if result is None:
+            return
+        src_rect, dest_size, draw_pos = result
+        view = Transformation(Vector2(world_transform.pos), world_transform.scale)
+        self._get_worker_pool().submit(self, rescale_job, self.surf, src_rect, dest_size, draw_pos, view)
+
+    def _get_worker_pool(self) -> WorkerPool:
+        if self.worker_pool is None:
+            self.worker_pool = get_worker_pool()
+        return self.worker_pool
+
+    def _cache_covers(self, world_transform: Transformation) -> bool:
+        """Check if the cached surface, shifted to the current view, covers everything visible."""
+        if self._cached_surf is None or self._cached_world_transform.scale != world_transform.scale:
+            return False
+        offset = (self._cached_world_transform.pos - world_transform.pos) * world_transform.scale
+        cached_rect = pygame.FRect(self._cached_draw_pos + offset, self._cached_surf.get_size())
+        screen_pos = (self.transformation.pos - world_transform.pos) * world_transform.scale
+        needed = pygame.FRect(screen_pos, Vector2(self.surf.get_size()) * world_transform.scale)
+        needed = needed.clip((0, 0, world_globals.win_width, world_globals.win_height))
+        return cached_rect.inflate(2, 2).contains(needed)
+
+    def _draw_stretched(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        """Draw the cached surface mapped to the current view, cropping before stretching."""
+        cached_transform = self._cached_world_transform
+        ratio = world_transform.scale / cached_transform.scale
+        origin_world = self._cached_draw_pos / cached_transform.scale + cached_transform.pos
+        draw_pos = (origin_world - world_transform.pos) * world_transform.scale
+        if ratio == 1:
+            self._stretched = None
+            win.blit(self._cached_surf, draw_pos)
+            profiler.count('blits_issued')
+            return
+
+        needed = pygame.Rect(
+            int(-draw_pos.x / ratio), int(-draw_pos.y / ratio),
+            int(world_globals.win_width / ratio) + 2, int(world_globals.win_height / ratio) + 2,
+        ).clip(self._cached_surf.get_rect())
+        if needed.w <= 0 or needed.h <= 0:
+            return
+        stretched = self._stretched
+        if (stretched is None or stretched[0] is not self._cached_surf or stretched[1] != world_transform.scale
+                or not stretched[2].contains(needed)):
+            # stretched once per scale with half a window of margin, panning at that scale only blits
+            src_rect = needed.inflate(needed.w, needed.h).clip(self._cached_surf.get_rect())
+            dest_size = (int(src_rect.w * ratio) + 1, int(src_rect.h * ratio) + 1)
+            stretched = (self._cached_surf, world_transform.scale, src_rect, scale_region(self._cached_surf, src_rect, dest_size))
+            self._stretched = stretched
+            profiler.count('surfaces_scaled')
+        win.blit(stretched[3], draw_pos + Vector2(stretched[2].topleft) * ratio)
+        profiler.count('blits_issued')
+
+    def _draw_async(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        self._pan_tracker.update(world_transform)
+        pool = self._get_worker_pool()
+        result = pool.poll(self)
+        if result is not None:
+            self._cached_surf, self._cached_draw_pos, self._cached_world_transform = result
+            self.mark_dirty()
+
+        if self._needs_recalculation(world_transform) and not self._cache_covers(world_transform):
+            if not pool.is_pending(self):
+                self._request_cache(world_transform)
+
+        self._draw_stretched(win, world_transform)
+
     def draw(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        if self.async_rescale and self._cached_surf is not None:
+            self._draw_async(win, world_transform)
+            return
+
         if self._needs_recalculation(world_transform):
             if not self._update_cache(world_transform):
                 return  # Nothing visible
         
         win.blit(self._cached_surf, self._cached_draw_pos)
+        profiler.count('blits_issued')
+
+
+def scale_region(surf: pygame.Surface, src_rect: tuple, dest_size: tuple) -> pygame.Surface:
+    return pygame.transform.scale(surf.subsurface(src_rect), dest_size)
+
+
+def rescale_job(surf: pygame.Surface, src_rect: tuple, dest_size: tuple, draw_pos: Vector2, view: Transformation) -> tuple:
+    return scale_region(surf, src_rect, dest_size), draw_pos, view
 
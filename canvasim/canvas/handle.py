@@ -18,17 +18,34 @@ class Selectable(Protocol):
 
 
 class Handle:
+    __slots__ = ('transformation', 'radius', 'owner', 'index')
+
     def __init__(self, transformation: Transformation, radius: float, owner: Any):
         self.transformation = transformation
         self.radius = radius
         self.owner: Any = owner
+        # position in the handles of the owner, set by Element.add_handle
+        self.index = 0
+
+    @property
+    def pos(self) -> Vector2:
+        return self.transformation.pos
     
     def hit_test(self, world_pos: Vector2) -> bool:
-        my_world_pos = self.transformation
-        if (world_pos - my_world_pos.pos).length() < self.radius:
-            return True
-        return False
+        return world_pos.distance_to(self.transformation.pos) < self.radius
+
+    def set_pos(self, pos: Vector2) -> None:
+        self.transformation.pos.update(pos)
+        if hasattr(self.owner, 'on_handle_moved'):
+            self.owner.on_handle_moved(self)
     
+    def get_screen_rect(self, transform: Transformation) -> pygame.Rect:
+        screen_x = (self.transformation.pos[0] - transform.pos[0]) * transform.scale
+        screen_y = (self.transformation.pos[1] - transform.pos[1]) * transform.scale
+        radius = self.radius * transform.scale
+        return pygame.Rect(screen_x - radius, screen_y - radius, radius * 2, radius * 2).inflate(4, 4)
+
     def draw(self, win: pygame.Surface, transform: Transformation) -> None:
-        my_world_pos = transform.transform(self.transformation)
-        pygame.draw.circle(win, (255, 255, 255), my_world_pos.pos, self.radius * transform.scale, 1)
+        screen_x = (self.transformation.pos[0] - transform.pos[0]) * transform.scale
+        screen_y = (self.transformation.pos[1] - transform.pos[1]) * transform.scale
+        pygame.draw.circle(win, (255, 255, 255), (screen_x, screen_y), self.radius * transform.scale, 1)
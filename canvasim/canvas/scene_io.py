@@ -0,0 +1,471 @@
+
+'''
+Binary scene format for Database elements.
+
+A scene file is a header followed by chunks, each a 4 byte tag, a u32 payload length and the payload, little endian:
+    LAYR  layer names and cached flags, in draw order
+    IMGS  image table, every distinct image stored once as (optionally zlib compressed) raw pixels
+    ELEM  run of consecutive elements of one type and layer, their fields packed in arrays
+    END   end of the scene
+Images are decoded when the first element using them is read, and the reader hands out elements chunk by chunk
+so a scene can be added over several frames.
+'''
+
+from array import array
+from hashlib import sha1
+from itertools import groupby
+from operator import itemgetter
+from typing import BinaryIO, Iterator, Union
+import os
+import struct
+import sys
+import zlib
+
+import pygame
+
+from .element import Element, TokenElement, RectanglarSurfElement, Database, DEFAULT_LAYER
+from .assets import AssetManager
+
+MAGIC = b'CVSC'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHH')
+_CHUNK = struct.Struct('<4sI')
+_LAYER = struct.Struct('<BH')
+_IMAGE = struct.Struct('<IIBBB4s20sI')
+_ELEMENTS = struct.Struct('<BHI')
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+
+_SWAP = sys.byteorder == 'big'
+
+
+class SceneFormatError(ValueError):
+    """Raised when a file is not a scene or was written by a newer version"""
+
+
+def _pack(values: array) -> bytes:
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(typecode: str, data: memoryview, offset: int, count: int) -> tuple[array, int]:
+    '''reads count values of typecode at offset, returns them and the offset after them'''
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if _SWAP:
+        values.byteswap()
+    return values, end
+
+
+def _pack_colors(colors: list) -> array:
+    packed = array('B')
+    for color in colors:
+        packed.extend(pygame.Color(color))
+    return packed
+
+
+def _unpack_colors(packed: array) -> list[tuple[int, int, int, int]]:
+    return [tuple(packed[i:i + 4]) for i in range(0, len(packed), 4)]
+
+
+class ImageTableWriter:
+    """Collects the distinct images of a scene, a surface shared by many elements or two surfaces
+    with the same pixels are stored once"""
+    def __init__(self, compress: bool = True):
+        self.compress = compress
+        self.entries: list[bytes] = []
+        self._indices: dict[pygame.Surface, int] = {}
+        self._digests: dict[bytes, int] = {}
+
+    def add(self, surf: pygame.Surface) -> int:
+        index = self._indices.get(surf)
+        if index is not None:
+            return index
+        channels = 4 if surf.get_flags() & pygame.SRCALPHA else 3
+        pixels = pygame.image.tobytes(surf, 'RGBA' if channels == 4 else 'RGB')
+        colorkey = surf.get_colorkey()
+        digest = sha1(pixels)
+        digest.update(struct.pack('<IIB', *surf.get_size(), channels))
+        if colorkey is not None:
+            digest.update(bytes(colorkey))
+        digest = digest.digest()
+        index = self._digests.get(digest)
+        if index is None:
+            index = len(self.entries)
+            compression = COMPRESSION_NONE
+            if self.compress:
+                pixels = zlib.compress(pixels, 1)
+                compression = COMPRESSION_ZLIB
+            header = _IMAGE.pack(
+                *surf.get_size(), channels, compression,
+                colorkey is not None, bytes(colorkey or (0, 0, 0, 0)), digest, len(pixels),
+            )
+            self.entries.append(header + pixels)
+            self._digests[digest] = index
+        self._indices[surf] = index
+        return index
+
+    def to_bytes(self) -> bytes:
+        return struct.pack('<I', len(self.entries)) + b''.join(self.entries)
+
+
+class ImageTable:
+    """Images of a scene being read. Pixels stay encoded until the first get of an image"""
+    def __init__(self, data: memoryview, assets: AssetManager = None):
+        self.assets = assets
+        self._entries: list[tuple] = []
+        self._surfaces: dict[int, pygame.Surface] = {}
+        count, = struct.unpack_from('<I', data, 0)
+        offset = 4
+        for _ in range(count):
+            width, height, channels, compression, has_colorkey, colorkey, digest, length = _IMAGE.unpack_from(data, offset)
+            offset += _IMAGE.size
+            colorkey = tuple(colorkey) if has_colorkey else None
+            self._entries.append(((width, height), channels, compression, colorkey, digest, data[offset:offset + length]))
+            offset += length
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, index: int) -> pygame.Surface:
+        surf = self._surfaces.get(index)
+        if surf is None:
+            surf = self._decode(index)
+            self._surfaces[index] = surf
+        return surf
+
+    def _decode(self, index: int) -> pygame.Surface:
+        size, channels, compression, colorkey, digest, pixels = self._entries[index]
+        key = 'scene:' + digest.hex()
+        if self.assets is not None:
+            surf = self.assets.get(key)
+            if surf is not None:
+                return surf
+        if compression == COMPRESSION_ZLIB:
+            pixels = zlib.decompress(pixels)
+        surf = pygame.image.frombytes(bytes(pixels), size, 'RGBA' if channels == 4 else 'RGB')
+        if colorkey is not None:
+            surf.set_colorkey(colorkey)
+        if self.assets is not None:
+            surf = self.assets.add(key, surf)
+        return surf
+
+
+class ElementCodec:
+    """Packs the elements of one type into arrays and builds them back.
+    Subclass and register_codec to store other element types"""
+    tag: int = None
+    element_type: type = None
+
+    def encode(self, elements: list[Element], images: ImageTableWriter) -> bytes:
+        ...
+
+    def decode(self, data: memoryview, count: int, images: ImageTable) -> Iterator[Element]:
+        ...
+
+
+def _set_surface_asset(element: Element, images: ImageTable) -> None:
+    '''gives the element a reference to its surface when the table shares surfaces through an asset manager'''
+    if images.assets is not None:
+        images.assets.retain(element.surf)
+        element.assets = images.assets
+
+
+class TokenCodec(ElementCodec):
+    tag = 1
+    element_type = TokenElement
+
+    def encode(self, elements: list[TokenElement], images: ImageTableWriter) -> bytes:
+        image_indices = array('I', [images.add(element.surf) for element in elements])
+        positions = array('d')
+        scales = array('d')
+        for element in elements:
+            positions.extend(element.transformation.pos)
+            scales.append(element.transformation.scale)
+        return _pack(image_indices) + _pack(positions) + _pack(scales)
+
+    def decode(self, data: memoryview, count: int, images: ImageTable) -> Iterator[TokenElement]:
+        image_indices, offset = _unpack('I', data, 0, count)
+        positions, offset = _unpack('d', data, offset, count * 2)
+        scales, offset = _unpack('d', data, offset, count)
+        for i in range(count):
+            element = TokenElement(images.get(image_indices[i]))
+            element.transformation.pos.update(positions[i * 2], positions[i * 2 + 1])
+            element.transformation.scale = scales[i]
+            _set_surface_asset(element, images)
+            yield element
+
+
+class RectanglarSurfCodec(ElementCodec):
+    tag = 2
+    element_type = RectanglarSurfElement
+
+    def encode(self, elements: list[RectanglarSurfElement], images: ImageTableWriter) -> bytes:
+        image_indices = array('I', [images.add(element.surf) for element in elements])
+        positions = array('d')
+        for element in elements:
+            positions.extend(element.transformation.pos)
+        flags = array('B', [bool(element.async_rescale) for element in elements])
+        return _pack(image_indices) + _pack(positions) + _pack(flags)
+
+    def decode(self, data: memoryview, count: int, images: ImageTable) -> Iterator[RectanglarSurfElement]:
+        image_indices, offset = _unpack('I', data, 0, count)
+        positions, offset = _unpack('d', data, offset, count * 2)
+        flags, offset = _unpack('B', data, offset, count)
+        for i in range(count):
+            element = RectanglarSurfElement(images.get(image_indices[i]), async_rescale=bool(flags[i]))
+            element.transformation.pos.update(positions[i * 2], positions[i * 2 + 1])
+            _set_surface_asset(element, images)
+            yield element
+
+
+class PolygonCodec(ElementCodec):
+    tag = 3
+
+    @property
+    def element_type(self) -> type:
+        from ..shapes import Polygon
+        return Polygon
+
+    def encode(self, elements: list, images: ImageTableWriter) -> bytes:
+        colors = _pack_colors([element.color for element in elements])
+        vertex_counts = array('I', [len(element) for element in elements])
+        coords = array('d')
+        for element in elements:
+            coords.extend(element.coords)
+        return _pack(colors) + _pack(vertex_counts) + _pack(coords)
+
+    def decode(self, data: memoryview, count: int, images: ImageTable) -> Iterator[Element]:
+        from ..shapes import Polygon
+        colors, offset = _unpack('B', data, 0, count * 4)
+        colors = _unpack_colors(colors)
+        vertex_counts, offset = _unpack('I', data, offset, count)
+        coords, offset = _unpack('d', data, offset, sum(vertex_counts) * 2)
+        start = 0
+        for i in range(count):
+            end = start + vertex_counts[i] * 2
+            yield Polygon.from_coords(colors[i], coords[start:end])
+            start = end
+
+
+class RectangleCodec(ElementCodec):
+    tag = 4
+
+    @property
+    def element_type(self) -> type:
+        from ..shapes import Rectangle
+        return Rectangle
+
+    def encode(self, elements: list, images: ImageTableWriter) -> bytes:
+        colors = _pack_colors([element.color for element in elements])
+        rects = array('d')
+        for element in elements:
+            rects.extend(element.transformation.pos)
+            rects.extend(element.size)
+        return _pack(colors) + _pack(rects)
+
+    def decode(self, data: memoryview, count: int, images: ImageTable) -> Iterator[Element]:
+        from ..shapes import Rectangle
+        colors, offset = _unpack('B', data, 0, count * 4)
+        colors = _unpack_colors(colors)
+        rects, offset = _unpack('d', data, offset, count * 4)
+        for i in range(count):
+            x, y, width, height = rects[i * 4:i * 4 + 4]
+            yield Rectangle(colors[i], (x, y), size=(width, height))
+
+
+_codecs_by_tag: dict[int, ElementCodec] = {}
+
+
+def register_codec(codec: ElementCodec) -> None:
+    '''makes save_scene store elements of codec.element_type, tags must be unique'''
+    if codec.tag in _codecs_by_tag and type(_codecs_by_tag[codec.tag]) is not type(codec):
+        raise ValueError(f'scene codec tag {codec.tag} is already used by {type(_codecs_by_tag[codec.tag]).__name__}')
+    _codecs_by_tag[codec.tag] = codec
+
+
+def get_codec(element: Element) -> ElementCodec:
+    '''codec of the exact type of element, None when the type cannot be stored'''
+    for codec in _codecs_by_tag.values():
+        if type(element) is codec.element_type:
+            return codec
+    return None
+
+
+for _codec in (TokenCodec(), RectanglarSurfCodec(), PolygonCodec(), RectangleCodec()):
+    register_codec(_codec)
+
+
+Source = Union[str, os.PathLike, BinaryIO]
+
+
+def _write_chunk(file: BinaryIO, tag: bytes, payload: bytes) -> None:
+    file.write(_CHUNK.pack(tag, len(payload)))
+    file.write(payload)
+
+
+def save_scene(database: Database, target: Source, compress_images: bool = True, skip_unknown: bool = False) -> None:
+    '''writes the elements of database, in draw order, to a path or binary file.
+    Elements without a registered codec raise TypeError unless skip_unknown is set'''
+    if not hasattr(target, 'write'):
+        with open(target, 'wb') as file:
+            save_scene(database, file, compress_images, skip_unknown)
+        return
+
+    layer_names = list(database.layers)
+    layer_indices = {name: index for index, name in enumerate(layer_names)}
+    images = ImageTableWriter(compress_images)
+
+    # consecutive elements of the same type and layer are packed together
+    runs: list[tuple[ElementCodec, int, list[Element]]] = []
+    codecs: dict[type, ElementCodec] = {}
+    for element in database.elements:
+        element_type = type(element)
+        if element_type not in codecs:
+            codecs[element_type] = get_codec(element)
+        codec = codecs[element_type]
+        if codec is None:
+            if skip_unknown:
+                continue
+            raise TypeError(f'no scene codec for {element_type.__name__}, register one with register_codec')
+        layer = layer_indices[database.get_layer(element).name]
+        if runs and runs[-1][0] is codec and runs[-1][1] == layer:
+            runs[-1][2].append(element)
+        else:
+            runs.append((codec, layer, [element]))
+    element_chunks = [
+        _ELEMENTS.pack(codec.tag, layer, len(elements)) + codec.encode(elements, images)
+        for codec, layer, elements in runs
+    ]
+
+    target.write(_HEADER.pack(MAGIC, VERSION, 0))
+    layers = bytearray(struct.pack('<H', len(layer_names)))
+    for name in layer_names:
+        encoded = name.encode('utf-8')
+        layers += _LAYER.pack(database.layers[name].cached, len(encoded)) + encoded
+    _write_chunk(target, b'LAYR', bytes(layers))
+    _write_chunk(target, b'IMGS', images.to_bytes())
+    for chunk in element_chunks:
+        _write_chunk(target, b'ELEM', chunk)
+    _write_chunk(target, b'END\0', b'')
+
+
+class SceneReader:
+    """Streams the elements of a scene file. The layer and image tables are read up front,
+    element chunks are read and decoded only as elements are requested"""
+    def __init__(self, source: Source, assets: AssetManager = None):
+        self._owns_file = not hasattr(source, 'read')
+        self.file: BinaryIO = open(source, 'rb') if self._owns_file else source
+        self.layers: list[tuple[str, bool]] = []
+        self.images: ImageTable = None
+        self.done = False
+        self.elements_read = 0
+        self._pending: Iterator[tuple[Element, str]] = iter(())
+
+        magic, version, _ = _HEADER.unpack(self._read_exact(_HEADER.size))
+        if magic != MAGIC:
+            raise SceneFormatError('not a scene file')
+        if version > VERSION:
+            raise SceneFormatError(f'scene version {version} is newer than the supported version {VERSION}')
+
+        tag, payload = self._read_chunk()
+        if tag != b'LAYR':
+            raise SceneFormatError('scene has no layer table')
+        count, = struct.unpack_from('<H', payload, 0)
+        offset = 2
+        for _ in range(count):
+            cached, length = _LAYER.unpack_from(payload, offset)
+            offset += _LAYER.size
+            self.layers.append((bytes(payload[offset:offset + length]).decode('utf-8'), bool(cached)))
+            offset += length
+
+        tag, payload = self._read_chunk()
+        if tag != b'IMGS':
+            raise SceneFormatError('scene has no image table')
+        self.images = ImageTable(payload, assets)
+
+    def __enter__(self) -> 'SceneReader':
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+    def close(self) -> None:
+        if self._owns_file and not self.file.closed:
+            self.file.close()
+
+    def _read_exact(self, size: int) -> bytes:
+        data = self.file.read(size)
+        if len(data) != size:
+            raise SceneFormatError('scene file is truncated')
+        return data
+
+    def _read_chunk(self) -> tuple[bytes, memoryview]:
+        tag, length = _CHUNK.unpack(self._read_exact(_CHUNK.size))
+        return tag, memoryview(self._read_exact(length))
+
+    def _next_chunk(self) -> bool:
+        '''queues the elements of the next element chunk, False at the end of the scene'''
+        while True:
+            tag, payload = self._read_chunk()
+            if tag == b'END\0':
+                return False
+            if tag != b'ELEM':
+                # unknown chunks of newer writers are skipped
+                continue
+            codec_tag, layer, count = _ELEMENTS.unpack_from(payload, 0)
+            codec = _codecs_by_tag.get(codec_tag)
+            if codec is None:
+                raise SceneFormatError(f'no scene codec registered for tag {codec_tag}')
+            layer_name = self.layers[layer][0]
+            elements = codec.decode(payload[_ELEMENTS.size:], count, self.images)
+            self._pending = ((element, layer_name) for element in elements)
+            return True
+
+    def read(self, max_elements: int = None) -> list[tuple[Element, str]]:
+        '''returns up to max_elements (element, layer name) pairs, all remaining ones when None'''
+        result: list[tuple[Element, str]] = []
+        while not self.done and (max_elements is None or len(result) < max_elements):
+            for item in self._pending:
+                result.append(item)
+                if max_elements is not None and len(result) >= max_elements:
+                    break
+            else:
+                if not self._next_chunk():
+                    self.done = True
+                    self.close()
+        self.elements_read += len(result)
+        return result
+
+    def __iter__(self) -> Iterator[tuple[Element, str]]:
+        while not self.done:
+            yield from self.read(1024)
+
+    def add_layers(self, target) -> None:
+        '''creates the scene layers in target, a Database or WorldCanvas'''
+        for name, cached in self.layers:
+            if name == DEFAULT_LAYER:
+                continue
+            target.add_layer(name, cached)
+
+    def load_into(self, target, max_elements: int = None) -> bool:
+        '''adds up to max_elements elements to target, a Database or WorldCanvas. Returns True once the scene is complete'''
+        for layer, items in groupby(self.read(max_elements), key=itemgetter(1)):
+            target.add_elements([element for element, _ in items], layer)
+        return self.done
+
+
+def load_scene(source: Source, database: Database = None, assets: AssetManager = None) -> Database:
+    '''reads a whole scene into database, a new one when None'''
+    if database is None:
+        database = Database()
+    with SceneReader(source, assets) as reader:
+        reader.add_layers(database)
+        reader.load_into(database)
+    return database
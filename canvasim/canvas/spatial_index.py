@@ -0,0 +1,160 @@
+
+from array import array
+from typing import Any, Hashable, Iterator
+
+import pygame
+from pygame import Vector2
+
+
+class SpatialIndex:
+    """Base class for spatial indices over world-space bounding rectangles"""
+    def insert(self, item: Hashable, bounds: pygame.FRect) -> None:
+        ...
+
+    def update(self, item: Hashable, bounds: pygame.FRect) -> None:
+        ...
+
+    def remove(self, item: Hashable) -> None:
+        ...
+
+    def query_point(self, world_pos: Vector2) -> list[Any]:
+        '''returns candidate items whose bounds may contain world_pos'''
+        return self.query_rect(pygame.FRect(world_pos, (0, 0)))
+
+    def query_rect(self, rect: pygame.FRect) -> list[Any]:
+        '''returns candidate items whose bounds may intersect rect'''
+        ...
+
+
+class LinearIndex(SpatialIndex):
+    """Trivial index, every query returns every item. Useful for tiny scenes and for reference"""
+    def __init__(self):
+        self.items: dict[Hashable, None] = {}
+
+    def insert(self, item, bounds):
+        self.items[item] = None
+
+    def update(self, item, bounds):
+        self.items[item] = None
+
+    def remove(self, item):
+        self.items.pop(item, None)
+
+    def query_rect(self, rect):
+        return list(self.items)
+
+
+class GridIndex(SpatialIndex):
+    """Uniform grid hashing items into every cell their bounds touch"""
+    def __init__(self, cell_size: float = 128):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], dict[Hashable, None]] = {}
+        self.item_cells: dict[Hashable, tuple[int, int, int, int]] = {}
+
+    def _cell_range(self, bounds: pygame.FRect) -> tuple[int, int, int, int]:
+        size = self.cell_size
+        return (
+            int(bounds.left // size),
+            int(bounds.top // size),
+            int(bounds.right // size),
+            int(bounds.bottom // size),
+        )
+
+    def _iter_cells(self, cell_range: tuple[int, int, int, int]) -> Iterator[tuple[int, int]]:
+        left, top, right, bottom = cell_range
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                yield cx, cy
+
+    def insert(self, item, bounds):
+        self._insert(item, self._cell_range(bounds))
+
+    def _insert(self, item: Hashable, cell_range: tuple[int, int, int, int]) -> None:
+        self.item_cells[item] = cell_range
+        for cell in self._iter_cells(cell_range):
+            self.cells.setdefault(cell, {})[item] = None
+
+    def update(self, item, bounds):
+        cell_range = self._cell_range(bounds)
+        old_range = self.item_cells.get(item)
+        if old_range == cell_range:
+            return
+        if old_range is not None:
+            self.remove(item)
+        self._insert(item, cell_range)
+
+    def remove(self, item):
+        cell_range = self.item_cells.pop(item, None)
+        if cell_range is None:
+            return
+        for cell in self._iter_cells(cell_range):
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                continue
+            bucket.pop(item, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def query_rect(self, rect):
+        cell_range = self._cell_range(rect)
+        if cell_range[0] == cell_range[2] and cell_range[1] == cell_range[3]:
+            return list(self.cells.get((cell_range[0], cell_range[1]), ()))
+        found: dict[Hashable, None] = {}
+        for cell in self._iter_cells(cell_range):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return list(found)
+
+
+class PointGrid:
+    """Uniform grid over the points of a packed x0, y0, x1, y1, ... coordinate array.
+    Cells hold arrays of point indices, so there is no Python object per point"""
+    def __init__(self, coords: array, cell_size: float = 128):
+        self.coords = coords
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], array] = {}
+        for index in range(len(coords) // 2):
+            self.insert(index)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, index: int) -> None:
+        '''adds the point at index, call after it was written to the coordinate array'''
+        cell = self._cell(self.coords[index * 2], self.coords[index * 2 + 1])
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = array('I')
+        bucket.append(index)
+
+    def move(self, index: int, x: float, y: float) -> None:
+        '''moves the point at index to x, y, call before the coordinate array is changed'''
+        old_cell = self._cell(self.coords[index * 2], self.coords[index * 2 + 1])
+        new_cell = self._cell(x, y)
+        if old_cell == new_cell:
+            return
+        bucket = self.cells[old_cell]
+        bucket.remove(index)
+        if not bucket:
+            del self.cells[old_cell]
+        bucket = self.cells.get(new_cell)
+        if bucket is None:
+            bucket = self.cells[new_cell] = array('I')
+        bucket.append(index)
+
+    def query_rect(self, rect: pygame.FRect) -> list[int]:
+        '''returns the indices of the points inside rect'''
+        coords = self.coords
+        left, top = self._cell(rect.left, rect.top)
+        right, bottom = self._cell(rect.right, rect.bottom)
+        found = []
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is None:
+                    continue
+                for index in bucket:
+                    if rect.left <= coords[index * 2] <= rect.right and rect.top <= coords[index * 2 + 1] <= rect.bottom:
+                        found.append(index)
+        return found
@@ -0,0 +1,120 @@
+
+from collections import OrderedDict
+from math import floor, log2
+from typing import Any
+
+import pygame
+
+from ..profiler import profiler
+
+
+class ScaledSurfaceCache:
+    """Shared LRU cache of scaled surfaces keyed by (source surface, quantized scale)"""
+    def __init__(self, budget_bytes: int = 64 * 1024 * 1024, steps_per_octave: int = 16, use_mipmaps: bool = True):
+        self.budget_bytes = budget_bytes
+        self.steps_per_octave = steps_per_octave
+        self.use_mipmaps = use_mipmaps
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[pygame.Surface, Any], pygame.Surface] = OrderedDict()
+
+    def quantize(self, scale: float) -> float:
+        '''snaps scale to the nearest of steps_per_octave buckets per power of two'''
+        return 2 ** (round(log2(scale) * self.steps_per_octave) / self.steps_per_octave)
+
+    def get_max_scale_error(self) -> float:
+        '''largest factor a quantized scale can exceed the requested scale by, half a bucket'''
+        return 2 ** (0.5 / self.steps_per_octave)
+
+    def set_budget(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.used_bytes = 0
+
+    def invalidate(self, surf: pygame.Surface) -> None:
+        '''drops every cached scale of surf, call after drawing on the source surface'''
+        for key in [key for key in self._entries if key[0] is surf]:
+            self.used_bytes -= surface_bytes(self._entries.pop(key))
+
+    def get(self, surf: pygame.Surface, scale: float) -> pygame.Surface:
+        '''returns surf scaled by the quantized scale, None if it would be empty'''
+        if scale <= 0:
+            return None
+        scale = self.quantize(scale)
+        if scale == 1.0:
+            self.hits += 1
+            return surf
+        key = (surf, scale)
+        scaled = self._entries.get(key)
+        if scaled is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return scaled
+
+        width, height = surf.get_size()
+        size = (int(width * scale), int(height * scale))
+        if size[0] <= 0 or size[1] <= 0:
+            self.misses += 1
+            return None
+
+        source = surf
+        built = False
+        if self.use_mipmaps and scale < 0.5:
+            level = floor(log2(1 / scale))
+            built = (surf, ('mip', level)) not in self._entries
+            source = self._get_mipmap(surf, level)
+        if source.get_size() == size:
+            # already the target size, the source or mipmap is not stored a second time under this key
+            if built:
+                self.misses += 1
+                profiler.count('surfaces_scaled')
+            else:
+                self.hits += 1
+            return source
+
+        self.misses += 1
+        profiler.count('surfaces_scaled')
+        scaled = pygame.transform.scale(source, size)
+        self._store(key, scaled)
+        return scaled
+
+    def _get_mipmap(self, surf: pygame.Surface, level: int) -> pygame.Surface:
+        '''returns surf halved level times, each level built from the previous one'''
+        if level <= 0:
+            return surf
+        key = (surf, ('mip', level))
+        mipmap = self._entries.get(key)
+        if mipmap is not None:
+            self._entries.move_to_end(key)
+            return mipmap
+
+        parent = self._get_mipmap(surf, level - 1)
+        size = (max(1, parent.get_width() // 2), max(1, parent.get_height() // 2))
+        if parent.get_bitsize() >= 24:
+            mipmap = pygame.transform.smoothscale(parent, size)
+        else:
+            mipmap = pygame.transform.scale(parent, size)
+        self._store(key, mipmap)
+        return mipmap
+
+    def _store(self, key: tuple[pygame.Surface, Any], surf: pygame.Surface) -> None:
+        self._entries[key] = surf
+        self.used_bytes += surface_bytes(surf)
+        self._evict()
+
+    def _evict(self) -> None:
+        # keep at least the most recent entry so the current draw always succeeds
+        while self.used_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, surf = self._entries.popitem(last=False)
+            self.used_bytes -= surface_bytes(surf)
+
+
+def surface_bytes(surf: pygame.Surface) -> int:
+    return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+scaled_surface_cache = ScaledSurfaceCache()
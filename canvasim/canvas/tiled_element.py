@@ -0,0 +1,303 @@
+
+from collections import OrderedDict
+from math import floor, log2
+import json
+import os
+
+import pygame
+from pygame import Vector2
+
+from .transformation import Transformation
+from .element import Element
+from .surface_cache import surface_bytes
+from .assets import to_display_format
+from .workers import WorkerPool, PanTracker, get_worker_pool
+from ..profiler import profiler
+
+TILE_SIZE = 256
+META_FILE = 'pyramid.json'
+
+
+class TilePyramid:
+    """Multi-resolution tile pyramid stored on disk, level 0 is full resolution and each level halves the previous"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE), 'r') as f:
+            meta = json.load(f)
+        self.width: int = meta['width']
+        self.height: int = meta['height']
+        self.tile_size: int = meta['tile_size']
+        self.levels: list[tuple[int, int]] = [tuple(size) for size in meta['levels']]
+
+    @classmethod
+    def build(cls, image_path: str, path: str, tile_size: int = TILE_SIZE) -> 'TilePyramid':
+        '''slices an image file into a tile pyramid under path, run once per image'''
+        image = pygame.image.load(image_path)
+        levels = []
+        level = 0
+        while True:
+            levels.append(image.get_size())
+            level_path = os.path.join(path, str(level))
+            os.makedirs(level_path, exist_ok=True)
+            for ty in range(0, image.get_height(), tile_size):
+                for tx in range(0, image.get_width(), tile_size):
+                    rect = pygame.Rect(tx, ty, tile_size, tile_size).clip(image.get_rect())
+                    pygame.image.save(image.subsurface(rect), os.path.join(level_path, f'{tx // tile_size}_{ty // tile_size}.png'))
+
+            if image.get_width() <= tile_size and image.get_height() <= tile_size:
+                break
+            size = (max(1, image.get_width() // 2), max(1, image.get_height() // 2))
+            if image.get_bitsize() >= 24:
+                image = pygame.transform.smoothscale(image, size)
+            else:
+                image = pygame.transform.scale(image, size)
+            level += 1
+
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump({'width': levels[0][0], 'height': levels[0][1], 'tile_size': tile_size, 'levels': levels}, f)
+        return cls(path)
+
+    def tile_path(self, level: int, tx: int, ty: int) -> str:
+        return os.path.join(self.path, str(level), f'{tx}_{ty}.png')
+
+    def load_tile(self, level: int, tx: int, ty: int) -> pygame.Surface:
+        return pygame.image.load(self.tile_path(level, tx, ty))
+
+    def get_level_for_scale(self, scale: float) -> int:
+        '''coarsest level that still has at least one source pixel per screen pixel'''
+        if scale >= 1:
+            return 0
+        return max(0, min(floor(log2(1 / scale)), len(self.levels) - 1))
+
+    def get_level_ratio(self, level: int) -> Vector2:
+        '''level pixels per world unit along each axis'''
+        level_width, level_height = self.levels[level]
+        return Vector2(level_width / self.width, level_height / self.height)
+
+    def get_tile_rect(self, level: int, tx: int, ty: int) -> pygame.Rect:
+        '''tile rect in level pixels'''
+        level_width, level_height = self.levels[level]
+        return pygame.Rect(tx * self.tile_size, ty * self.tile_size, self.tile_size, self.tile_size).clip((0, 0, level_width, level_height))
+
+
+class TileCache:
+    """LRU cache of loaded pyramid tiles bounded by a byte budget"""
+    def __init__(self, budget_bytes: int = 128 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._tiles: OrderedDict[tuple[str, int, int, int], pygame.Surface] = OrderedDict()
+
+    def get(self, pyramid: TilePyramid, level: int, tx: int, ty: int) -> pygame.Surface:
+        '''returns the cached tile, None if not loaded'''
+        key = (pyramid.path, level, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def load(self, pyramid: TilePyramid, level: int, tx: int, ty: int) -> pygame.Surface:
+        tile = self.get(pyramid, level, tx, ty)
+        if tile is None:
+            tile = pyramid.load_tile(level, tx, ty)
+            self.put(pyramid, level, tx, ty, tile)
+        return tile
+
+    def put(self, pyramid: TilePyramid, level: int, tx: int, ty: int, tile: pygame.Surface) -> None:
+        key = (pyramid.path, level, tx, ty)
+        # converted here on the main thread, tiles decoded by workers arrive in the file format
+        tile = to_display_format(tile)
+        old = self._tiles.pop(key, None)
+        if old is not None:
+            self.used_bytes -= surface_bytes(old)
+        self._tiles[key] = tile
+        self.used_bytes += surface_bytes(tile)
+        while self.used_bytes > self.budget_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.used_bytes -= surface_bytes(evicted)
+
+
+default_tile_cache = TileCache()
+
+
+class TiledSurfElement(Element):
+    """Large image drawn from a tile pyramid, only the tiles visible at the current level of detail are loaded"""
+    __slots__ = (
+        'pyramid', 'tile_cache', '_cached_blits', '_cached_world_transform', '_cached_pos', '_scaled_tiles', '_scaled_scale',
+        'async_load', 'worker_pool', '_pending', '_failed', '_pan_tracker',
+    )
+
+    def __init__(self, pyramid: TilePyramid, tile_cache: TileCache = None, async_load: bool = False, worker_pool: WorkerPool = None):
+        super().__init__()
+        self.pyramid = pyramid
+        self.tile_cache = tile_cache if tile_cache is not None else default_tile_cache
+        # Cache
+        self._cached_blits: list[tuple[pygame.Surface, tuple[int, int]]] = []
+        self._cached_world_transform: Transformation = None
+        self._cached_pos: Vector2 = None
+        # (source, scaled tile) by (level, tx, ty, size) for the visible tiles at _scaled_scale, panning reuses them.
+        # rounding the tile edges gives a tile one of two sizes depending on the pan offset, both are kept
+        self._scaled_tiles: dict[tuple, tuple[pygame.Surface, pygame.Surface]] = {}
+        self._scaled_scale: float = None
+        # Background loading, missing tiles are drawn from coarser levels until they arrive
+        self.async_load = async_load
+        self.worker_pool = worker_pool
+        self._pending: set[tuple[str, int, int, int]] = set()
+        # tiles whose file could not be loaded, they keep showing their placeholder instead of being requested again
+        self._failed: set[tuple[str, int, int, int]] = set()
+        self._pan_tracker = PanTracker()
+
+    def get_world_bounds(self) -> pygame.FRect:
+        return pygame.FRect(self.transformation.pos, (self.pyramid.width, self.pyramid.height))
+
+    def _needs_recalculation(self, world_transform: Transformation) -> bool:
+        if self._cached_world_transform is None:
+            return True
+        return (self._cached_world_transform.pos != world_transform.pos or
+                self._cached_world_transform.scale != world_transform.scale or
+                self._cached_pos != self.transformation.pos)
+
+    def get_visible_tiles(self, level: int, visible_rect: pygame.FRect) -> list[tuple[int, int]]:
+        '''tile coordinates of level intersecting the visible world rect'''
+        visible = self.get_world_bounds().clip(visible_rect)
+        if visible.w <= 0 or visible.h <= 0:
+            return []
+        ratio = self.pyramid.get_level_ratio(level)
+        tile_size = self.pyramid.tile_size
+        level_width, level_height = self.pyramid.levels[level]
+        left = int((visible.left - self.transformation.pos.x) * ratio.x // tile_size)
+        top = int((visible.top - self.transformation.pos.y) * ratio.y // tile_size)
+        right = min(int((visible.right - self.transformation.pos.x) * ratio.x // tile_size), (level_width - 1) // tile_size)
+        bottom = min(int((visible.bottom - self.transformation.pos.y) * ratio.y // tile_size), (level_height - 1) // tile_size)
+        return [(tx, ty) for ty in range(top, bottom + 1) for tx in range(left, right + 1)]
+
+    def get_tile_screen_rect(self, world_transform: Transformation, level: int, tx: int, ty: int) -> pygame.Rect:
+        ratio = self.pyramid.get_level_ratio(level)
+        tile_rect = self.pyramid.get_tile_rect(level, tx, ty)
+        origin = (self.transformation.pos - world_transform.pos) * world_transform.scale
+        # round both edges so neighbouring tiles share them and no seams appear
+        left = round(origin.x + tile_rect.left / ratio.x * world_transform.scale)
+        top = round(origin.y + tile_rect.top / ratio.y * world_transform.scale)
+        right = round(origin.x + tile_rect.right / ratio.x * world_transform.scale)
+        bottom = round(origin.y + tile_rect.bottom / ratio.y * world_transform.scale)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def _get_worker_pool(self) -> WorkerPool:
+        if self.worker_pool is None:
+            self.worker_pool = get_worker_pool()
+        return self.worker_pool
+
+    def _request_tile(self, level: int, tx: int, ty: int) -> None:
+        key = (self.pyramid.path, level, tx, ty)
+        if key in self._pending or key in self._failed or self.tile_cache.get(self.pyramid, level, tx, ty) is not None:
+            return
+        self._get_worker_pool().submit(key, self.pyramid.load_tile, level, tx, ty)
+        self._pending.add(key)
+
+    def _collect_loaded_tiles(self) -> bool:
+        '''moves finished background loads into the tile cache, returns True if any arrived'''
+        pool = self._get_worker_pool()
+        loaded = False
+        for key in list(self._pending):
+            if pool.is_pending(key):
+                try:
+                    tile = pool.poll(key)
+                except (pygame.error, OSError):
+                    # missing or corrupt tile file
+                    self._pending.discard(key)
+                    self._failed.add(key)
+                    continue
+                if tile is None:
+                    continue
+                self.tile_cache.put(self.pyramid, *key[1:], tile)
+            # a job polled by another element sharing the pyramid is already in the cache
+            self._pending.discard(key)
+            loaded = True
+        return loaded
+
+    def _get_placeholder(self, level: int, tx: int, ty: int) -> pygame.Surface:
+        '''crop of the finest loaded coarser tile covering the tile, None if nothing is loaded'''
+        ratio = self.pyramid.get_level_ratio(level)
+        tile_rect = self.pyramid.get_tile_rect(level, tx, ty)
+        for parent_level in range(level + 1, len(self.pyramid.levels)):
+            shift = parent_level - level
+            parent_tx, parent_ty = tx >> shift, ty >> shift
+            parent = self.tile_cache.get(self.pyramid, parent_level, parent_tx, parent_ty)
+            if parent is None:
+                continue
+            parent_ratio = self.pyramid.get_level_ratio(parent_level)
+            parent_rect = self.pyramid.get_tile_rect(parent_level, parent_tx, parent_ty)
+            left = tile_rect.left / ratio.x * parent_ratio.x - parent_rect.left
+            top = tile_rect.top / ratio.y * parent_ratio.y - parent_rect.top
+            right = tile_rect.right / ratio.x * parent_ratio.x - parent_rect.left
+            bottom = tile_rect.bottom / ratio.y * parent_ratio.y - parent_rect.top
+            crop = pygame.Rect(int(left), int(top), max(1, round(right - left)), max(1, round(bottom - top))).clip(parent.get_rect())
+            if crop.w > 0 and crop.h > 0:
+                return parent.subsurface(crop)
+        return None
+
+    def _prefetch(self, win: pygame.Surface, world_transform: Transformation, level: int) -> None:
+        prefetch_rect = self._pan_tracker.get_prefetch_rect(win.get_rect())
+        world_rect = pygame.FRect(
+            world_transform.pos + Vector2(prefetch_rect.topleft) / world_transform.scale,
+            Vector2(prefetch_rect.size) / world_transform.scale,
+        )
+        for tx, ty in self.get_visible_tiles(level, world_rect):
+            self._request_tile(level, tx, ty)
+
+    def _get_scaled_tile(self, tile: pygame.Surface, key: tuple) -> pygame.Surface:
+        '''tile scaled to the size in key, reused from previous updates when it was scaled from the same source'''
+        # placeholders are fresh crops of a coarser tile, the coarser tile identifies them
+        source = tile.get_parent() or tile
+        cached = self._scaled_tiles.get(key)
+        if cached is None or cached[0] is not source:
+            cached = (source, pygame.transform.scale(tile, key[3]))
+            self._scaled_tiles[key] = cached
+            profiler.count('surfaces_scaled')
+        return cached[1]
+
+    def _update_cache(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        visible_rect = pygame.FRect(world_transform.pos, Vector2(win.get_size()) / world_transform.scale)
+        level = self.pyramid.get_level_for_scale(world_transform.scale)
+        if self.async_load:
+            # the coarsest level is a single tile, keep it around as the placeholder of last resort
+            self.tile_cache.load(self.pyramid, len(self.pyramid.levels) - 1, 0, 0)
+        self._cached_blits = []
+        if self._scaled_scale != world_transform.scale:
+            self._scaled_tiles = {}
+            self._scaled_scale = world_transform.scale
+        visible_tiles = self.get_visible_tiles(level, visible_rect)
+        for tx, ty in visible_tiles:
+            if self.async_load:
+                tile = self.tile_cache.get(self.pyramid, level, tx, ty)
+                if tile is None:
+                    self._request_tile(level, tx, ty)
+                    tile = self._get_placeholder(level, tx, ty)
+                    if tile is None:
+                        continue
+            else:
+                tile = self.tile_cache.load(self.pyramid, level, tx, ty)
+            rect = self.get_tile_screen_rect(world_transform, level, tx, ty)
+            if rect.w <= 0 or rect.h <= 0:
+                continue
+            if rect.size != tile.get_size():
+                tile = self._get_scaled_tile(tile, (level, tx, ty, rect.size))
+            self._cached_blits.append((tile, rect.topleft))
+        # scaled tiles that scrolled out are released
+        visible = {(level, tx, ty) for tx, ty in visible_tiles}
+        if len(self._scaled_tiles) > 2 * len(visible):
+            self._scaled_tiles = {key: value for key, value in self._scaled_tiles.items() if key[:3] in visible}
+        if self.async_load:
+            self._prefetch(win, world_transform, level)
+        self._cached_world_transform = Transformation(Vector2(world_transform.pos), world_transform.scale)
+        self._cached_pos = Vector2(self.transformation.pos)
+
+    def draw(self, win: pygame.Surface, world_transform: Transformation) -> None:
+        if self.async_load:
+            self._pan_tracker.update(world_transform)
+            if self._collect_loaded_tiles():
+                self._cached_world_transform = None
+                self.mark_dirty()
+        if self._needs_recalculation(world_transform):
+            self._update_cache(win, world_transform)
+        win.blits(self._cached_blits, doreturn=False)
+        profiler.count('blits_issued', len(self._cached_blits))
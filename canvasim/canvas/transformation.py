@@ -1,16 +1,76 @@
 
-from dataclasses import dataclass
+from typing import Sequence
 
 from pygame import Vector2
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
-@dataclass
 class Transformation:
-    pos: Vector2
-    scale: float = 1.0
+    __slots__ = ('pos', 'scale')
+
+    def __init__(self, pos: Vector2, scale: float = 1.0):
+        self.pos = pos
+        self.scale = scale
+
+    def __repr__(self) -> str:
+        return f'Transformation(pos={self.pos!r}, scale={self.scale!r})'
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Transformation):
+            return NotImplemented
+        return self.pos == other.pos and self.scale == other.scale
+
+    __hash__ = None
 
     def transform(self, transformation: 'Transformation') -> 'Transformation':
         return Transformation((transformation.pos - self.pos) * self.scale, self.scale * transformation.scale)
     
     def transform_back(self, transformation: 'Transformation') -> 'Transformation':
         return Transformation(transformation.pos / self.scale + self.pos, transformation.scale / self.scale)
+
+    def transform_into(self, transformation: 'Transformation', out: 'Transformation') -> 'Transformation':
+        '''transform writing into a preallocated out, returns out'''
+        out.pos.update((transformation.pos[0] - self.pos[0]) * self.scale, (transformation.pos[1] - self.pos[1]) * self.scale)
+        out.scale = self.scale * transformation.scale
+        return out
+
+    def transform_back_into(self, transformation: 'Transformation', out: 'Transformation') -> 'Transformation':
+        '''transform_back writing into a preallocated out, returns out'''
+        out.pos.update(transformation.pos[0] / self.scale + self.pos[0], transformation.pos[1] / self.scale + self.pos[1])
+        out.scale = transformation.scale / self.scale
+        return out
+
+    def transform_pos_into(self, pos: Sequence[float], out: Vector2) -> Vector2:
+        '''maps a world position to screen space writing into out, returns out'''
+        out.update((pos[0] - self.pos[0]) * self.scale, (pos[1] - self.pos[1]) * self.scale)
+        return out
+
+    def transform_pos_back_into(self, pos: Sequence[float], out: Vector2) -> Vector2:
+        '''maps a screen position to world space writing into out, returns out'''
+        out.update(pos[0] / self.scale + self.pos[0], pos[1] / self.scale + self.pos[1])
+        return out
+
+    def transform_points(self, points: Sequence) -> Sequence:
+        '''batch version of transform for positions, points is a sequence of (x, y) pairs or an (n, 2) array.
+        returns an (n, 2) numpy array when numpy is installed, a list of tuples otherwise'''
+        if np is not None:
+            return (np.asarray(points, dtype=float).reshape(-1, 2) - (self.pos.x, self.pos.y)) * self.scale
+        pos_x, pos_y, scale = self.pos.x, self.pos.y, self.scale
+        return [((x - pos_x) * scale, (y - pos_y) * scale) for x, y in points]
+
+    def transform_points_back(self, points: Sequence) -> Sequence:
+        '''batch version of transform_back for positions, see transform_points'''
+        if np is not None:
+            return np.asarray(points, dtype=float).reshape(-1, 2) / self.scale + (self.pos.x, self.pos.y)
+        pos_x, pos_y, scale = self.pos.x, self.pos.y, self.scale
+        return [(x / scale + pos_x, y / scale + pos_y) for x, y in points]
+
+    def transform_coords(self, coords: Sequence[float]) -> Sequence:
+        '''transform_points for flat x0, y0, x1, y1, ... coordinates such as an array('d')'''
+        if np is not None:
+            return self.transform_points(np.asarray(coords, dtype=float))
+        return self.transform_points(zip(coords[0::2], coords[1::2]))
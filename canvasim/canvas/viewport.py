@@ -4,6 +4,7 @@
 import pygame
 from pygame import Vector2
 
+from . import world_globals
 from .transformation import Transformation
 from .element import Element, Database
 from .handle import Handle
@@ -39,19 +40,41 @@ class Viewport:
         # self.hovered_handle = self.get_handle_at(mouse_in_world)
         # self.hovered_element = self.get_element_at(mouse_in_world)
 
+    def get_visible_world_rect(self) -> pygame.FRect:
+        scale = self.world_transform.scale
+        return pygame.FRect(self.world_transform.pos, (world_globals.win_width / scale, world_globals.win_height / scale))
+
+    def screen_to_world_rect(self, rect: pygame.Rect) -> pygame.FRect:
+        scale = self.world_transform.scale
+        pos = self.world_transform.pos
+        return pygame.FRect(rect.x / scale + pos.x, rect.y / scale + pos.y, rect.w / scale, rect.h / scale)
+
+    def world_to_screen_rect(self, rect: pygame.FRect) -> pygame.Rect:
+        scale = self.world_transform.scale
+        pos = self.world_transform.pos
+        screen_rect = pygame.FRect((rect.x - pos.x) * scale, (rect.y - pos.y) * scale, rect.w * scale, rect.h * scale)
+        # round outwards so antialiased and outlined edges are covered
+        return pygame.Rect(screen_rect).inflate(4, 4)
+
+    def get_dirty_rects(self) -> list[pygame.Rect]:
+        """Returns screen rects covered by viewport overlays this frame"""
+        return []
+
     def get_element_at(self, world_pos: Vector2) -> Element:
-        for element in reversed(self.database.elements):
+        for element in self.database.query_elements(world_pos):
             if element.hit_test(world_pos):
                 return element
         return None
 
     def get_handle_at(self, world_pos: Vector2) -> Handle:
-        for element in reversed(self.database.elements):
-            for handle in element.handles:
-                if handle.hit_test(world_pos):
-                    return handle
+        handles = self.database.query_handles(world_pos)
+        if handles:
+            return handles[0]
         return None
 
+    def get_handles_in_radius(self, world_pos: Vector2, radius: float) -> list[Handle]:
+        return self.database.query_handles(world_pos, radius)
+
     def draw(self, win: pygame.Surface, transform: Transformation) -> None:
         ...
         # if self.hovered_handle:
@@ -0,0 +1,82 @@
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+import pygame
+from pygame import Vector2
+
+from .transformation import Transformation
+
+# how many frames of panning ahead are prefetched
+PREFETCH_FRAMES = 8
+
+
+class WorkerPool:
+    """Thread pool for rescale and tile load jobs, pygame releases the GIL while scaling and decoding.
+    Jobs are keyed so each key has at most one job in flight, results are collected on the main thread with poll"""
+    def __init__(self, max_workers: int = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='canvasim')
+        self.jobs: dict[Hashable, Future] = {}
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args) -> bool:
+        '''queues fn(*args) under key, returns False if a job with that key is already in flight'''
+        if key in self.jobs:
+            return False
+        self.jobs[key] = self.executor.submit(fn, *args)
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self.jobs
+
+    def poll(self, key: Hashable) -> Any:
+        '''returns the result of the finished job under key, None while it is still running'''
+        future = self.jobs.get(key)
+        if future is None or not future.done():
+            return None
+        del self.jobs[key]
+        return future.result()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.jobs.clear()
+
+
+_worker_pool: WorkerPool = None
+
+
+def get_worker_pool() -> WorkerPool:
+    '''returns the shared worker pool, created on first use'''
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = WorkerPool()
+    return _worker_pool
+
+
+class PanTracker:
+    """Tracks the view movement between frames to predict where the user is panning"""
+    def __init__(self):
+        self.last_pos: Vector2 = None
+        self.velocity = Vector2()
+
+    def update(self, world_transform: Transformation) -> None:
+        if self.last_pos is not None:
+            self.velocity = (world_transform.pos - self.last_pos) * world_transform.scale
+        self.last_pos = Vector2(world_transform.pos)
+
+    def get_prefetch_rect(self, view_rect: pygame.Rect) -> pygame.Rect:
+        '''view_rect extended in the panning direction, in screen coordinates'''
+        ahead = self.velocity * PREFETCH_FRAMES
+        ahead_x = max(-view_rect.w, min(view_rect.w, ahead.x))
+        ahead_y = max(-view_rect.h, min(view_rect.h, ahead.y))
+        rect = pygame.Rect(view_rect)
+        if ahead_x > 0:
+            rect.w += ahead_x
+        else:
+            rect.x += ahead_x
+            rect.w -= ahead_x
+        if ahead_y > 0:
+            rect.h += ahead_y
+        else:
+            rect.y += ahead_y
+            rect.h -= ahead_y
+        return rect
@@ -9,10 +9,35 @@ from .edit_tool import EditTool, SelectTool
 from .transformation import Transformation
 from .viewport import Viewport
 from .draw_utils import draw_axis, draw_grid
-from .element import Element, Database
+from .element import Element, Database, Layer, DEFAULT_LAYER
+from .assets import AssetManager, display_converter
+from .scene_io import SceneReader, Source, save_scene
+from .surface_cache import scaled_surface_cache
+from ..profiler import profiler
+from ..event_utils import coalesce_motion
+
+# fraction of the window above which dirty-rect mode falls back to a full redraw
+FULL_REDRAW_RATIO = 0.5
+
+
+def merge_rects(rects: list[pygame.Rect]) -> list[pygame.Rect]:
+    '''merge overlapping rects so no region is repainted twice'''
+    merged: list[pygame.Rect] = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
 
 class WorldCanvas:
-    def __init__(self):
+    def __init__(self, dirty_rects: bool = False, convert_surfaces: bool = True, fixed_timestep: bool = False):
         self.win: pygame.Surface = None
         self.clock = pygame.time.Clock()
 
@@ -26,18 +51,92 @@ class WorldCanvas:
 
         self.assigned_tools: dict[int, Any] = {}
 
+        # dirty-rect rendering, when enabled draw() only repaints damaged regions
+        self.dirty_rects = dirty_rects
+        self.updated_rects: list[pygame.Rect] = None
+        self._full_redraw = True
+        self._last_view: tuple[Vector2, float] = None
+        self._last_overlay_rects: list[pygame.Rect] = []
+
+        # element surfaces are converted to the display format once the display exists
+        self.convert_surfaces = convert_surfaces
+
+        # fixed timestep mode, step() runs tick_rate times per second independent of the frame rate
+        # and dynamic elements are drawn interpolated between their last two ticks
+        self.fixed_timestep = fixed_timestep
+        self.tick_rate = world_globals.TICK_RATE
+        self.max_catch_up_ticks = world_globals.MAX_CATCH_UP_TICKS
+        self.interpolation = 1.0
+        self._accumulator = 0.0
+        self._previous_pos: dict[Element, Vector2] = {}
+
+        # F3 toggles the profiler hud in main_loop
+        self.profiler_key = pygame.K_F3
+        self._hud_rect: pygame.Rect = None
+
+        # scenes streaming in, (reader, elements added per draw)
+        self._scene_loads: list[tuple[SceneReader, int]] = []
+
     def initialize(self, width, height):
         world_globals.initialize(width, height)
         pygame.init()
         self.win = pygame.display.set_mode((world_globals.win_width, world_globals.win_height))
         pygame.display.set_caption("Map")
 
-    def add_element(self, element: Element) -> None:
-        self.database.elements.append(element)
+        display_converter.reset()
+        if self.convert_surfaces:
+            for element in self.database.elements:
+                element.convert_surfaces(display_converter.convert)
+
+    def add_element(self, element: Element, layer: str = DEFAULT_LAYER) -> None:
+        if self.convert_surfaces and self.win is not None:
+            element.convert_surfaces(display_converter.convert)
+        self.database.add_element(element, layer)
+
+    def add_elements(self, elements: list[Element], layer: str = DEFAULT_LAYER) -> None:
+        if self.convert_surfaces and self.win is not None:
+            for element in elements:
+                element.convert_surfaces(display_converter.convert)
+        self.database.add_elements(elements, layer)
+
+    def get_slow_path_elements(self) -> list[Element]:
+        '''elements blitting surfaces that are not in the display format, SDL converts their pixels on every blit'''
+        return [
+            element for element in self.database.elements
+            if not all(display_converter.is_display_format(surf) for surf in element.get_surfaces())
+        ]
+
+    def add_layer(self, name: str, cached: bool = False, below: str = None) -> Layer:
+        return self.database.add_layer(name, cached, below)
+
+    def save_scene(self, target: Source, **kwargs) -> None:
+        '''writes the elements to a scene file, kwargs are passed to scene_io.save_scene'''
+        save_scene(self.database, target, **kwargs)
+
+    def load_scene(self, source: Source, elements_per_frame: int = None, assets: AssetManager = None) -> SceneReader:
+        '''adds the elements of a scene file. With elements_per_frame the scene streams in over the next draws,
+        the first frames render while the rest is still being decoded'''
+        reader = SceneReader(source, assets)
+        reader.add_layers(self)
+        if elements_per_frame is None:
+            reader.load_into(self)
+        else:
+            self._scene_loads.append((reader, elements_per_frame))
+        return reader
+
+    def load_pending(self) -> None:
+        '''adds the next elements of streaming scenes, called by draw'''
+        for load in list(self._scene_loads):
+            reader, elements_per_frame = load
+            if reader.load_into(self, elements_per_frame):
+                self._scene_loads.remove(load)
 
     def handle_event(self, event) -> None:
         self.viewport.handle_event(event)
 
+        if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESIZED, pygame.VIDEOEXPOSE):
+            self._full_redraw = True
+
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             self.tool = self.tool.handle_mouse_down(event)
 
@@ -63,38 +162,150 @@ class WorldCanvas:
     def step(self) -> None:
         self.tool.step()
         self.viewport.step()
+        dt = 1 / (self.tick_rate if self.fixed_timestep else world_globals.FPS)
+        for element in list(self.database.dynamic_elements):
+            element.step(dt)
+
+    def advance(self, elapsed: float) -> int:
+        '''runs the fixed ticks covered by elapsed seconds, at most max_catch_up_ticks, returns how many ran'''
+        tick = 1 / self.tick_rate
+        self._accumulator += elapsed
+        ticks = 0
+        while self._accumulator >= tick:
+            if ticks == self.max_catch_up_ticks:
+                # rendering fell too far behind, drop the backlog instead of spiralling
+                self._accumulator %= tick
+                break
+            self._previous_pos = {element: Vector2(element.transformation.pos) for element in self.database.dynamic_elements}
+            self.step()
+            self._accumulator -= tick
+            ticks += 1
+        self.interpolation = self._accumulator / tick
+        return ticks
+
+    def _interpolate(self) -> None:
+        '''draws dynamic elements between their previous and current tick positions for this frame'''
+        for element, previous in self._previous_pos.items():
+            pos = element.transformation.pos
+            if element.database is not self.database or pos == previous:
+                continue
+            self.database.move_for_frame(element, previous.lerp(pos, self.interpolation))
 
     def draw(self) -> None:
+        if self._scene_loads:
+            with profiler.phase('scene_load'):
+                self.load_pending()
+        hits, misses = scaled_surface_cache.hits, scaled_surface_cache.misses
+        if self.fixed_timestep:
+            self._interpolate()
+        if not self.dirty_rects:
+            self.database.collect_damage()
+            self._draw_scene(self.viewport.get_visible_world_rect())
+            self.updated_rects = None
+        else:
+            rects = self._collect_dirty_rects()
+            if rects is not None and self._hud_rect is not None:
+                # the scene under the previous hud is repainted
+                rects = merge_rects(rects + [self._hud_rect])
+            if rects is None:
+                self._draw_scene(self.viewport.get_visible_world_rect())
+            else:
+                for rect in rects:
+                    self.win.set_clip(rect)
+                    self._draw_scene(self.viewport.screen_to_world_rect(rect))
+                self.win.set_clip(None)
+            self.updated_rects = rects
+
+        profiler.count('scale_cache_hits', scaled_surface_cache.hits - hits)
+        profiler.count('scale_cache_misses', scaled_surface_cache.misses - misses)
+        self._hud_rect = None
+        if profiler.show_hud:
+            self._hud_rect = profiler.draw_hud(self.win)
+            if self.updated_rects is not None:
+                self.updated_rects = merge_rects(self.updated_rects + [self._hud_rect])
+        self.database.restore_frame_positions()
+
+    def _draw_scene(self, visible_rect: pygame.FRect) -> None:
         self.win.fill((30, 30, 30))
 
-        draw_grid(self.win, self.world_transform)
-        draw_axis(self.win, self.world_transform)
+        with profiler.phase('grid'):
+            draw_grid(self.win, self.world_transform)
+            draw_axis(self.win, self.world_transform)
 
-        for element in self.database.elements:
-            element.draw(self.win, self.world_transform)
+        with profiler.phase('elements'):
+            for layer in self.database.layers.values():
+                layer.draw(self.win, self.world_transform, visible_rect)
 
-        self.tool.draw(self.win, self.world_transform)
-        self.viewport.draw(self.win, self.world_transform)
+        with profiler.phase('overlays'):
+            self.tool.draw(self.win, self.world_transform)
+            self.viewport.draw(self.win, self.world_transform)
+
+    def _collect_dirty_rects(self) -> list[pygame.Rect]:
+        """Returns the screen rects to repaint this frame, None for a full redraw"""
+        view = (Vector2(self.world_transform.pos), self.world_transform.scale)
+        overlay_rects = self.tool.get_dirty_rects(self.world_transform) + self.viewport.get_dirty_rects()
+        damage = self.database.collect_damage()
+
+        full_redraw = self._full_redraw or damage is None or view != self._last_view
+        # overlays are repainted only when they change
+        rects = []
+        if overlay_rects != self._last_overlay_rects:
+            rects = self._last_overlay_rects + overlay_rects
+        self._full_redraw = False
+        self._last_view = view
+        self._last_overlay_rects = overlay_rects
+        if full_redraw:
+            return None
+
+        rects += [self.viewport.world_to_screen_rect(bounds) for bounds in damage]
+        screen_rect = self.win.get_rect()
+        rects = merge_rects([rect.clip(screen_rect) for rect in rects if rect.colliderect(screen_rect)])
+        if sum(rect.w * rect.h for rect in rects) > screen_rect.w * screen_rect.h * FULL_REDRAW_RATIO:
+            return None
+        return rects
+
+    def present(self) -> None:
+        """Presents the last drawn frame, updating only the dirty rects when possible"""
+        if self.updated_rects is None:
+            pygame.display.flip()
+        elif self.updated_rects:
+            pygame.display.update(self.updated_rects)
 
     def assign_tool(self, key: int, tool_cls: Any) -> None:
         self.assigned_tools[key] = lambda: tool_cls(self.viewport)
 
     def main_loop(self):
         done = False
+        elapsed = 0.0
         while not done:
-            for event in pygame.event.get():
-                self.handle_event(event)
-                if event.type == pygame.QUIT:
-                    done = True
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
+            profiler.begin_frame()
+            with profiler.phase('events'):
+                events = pygame.event.get()
+                if not self.tool.raw_motion:
+                    events = coalesce_motion(events)
+                for event in events:
+                    self.handle_event(event)
+                    if event.type == pygame.QUIT:
                         done = True
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_ESCAPE:
+                            done = True
+                        elif event.key == self.profiler_key:
+                            profiler.toggle()
+                            self._full_redraw = True
 
-            self.step()
-            self.draw()
+            with profiler.phase('step'):
+                if self.fixed_timestep:
+                    self.advance(elapsed)
+                else:
+                    self.step()
+            with profiler.phase('draw'):
+                self.draw()
 
-            pygame.display.flip()
-            self.clock.tick(world_globals.FPS)
+            with profiler.phase('present'):
+                self.present()
+            profiler.end_frame()
+            elapsed = self.clock.tick(world_globals.FPS) / 1000
         pygame.quit()
 
 
@@ -2,6 +2,9 @@
 
 win_width, win_height = 1280, 720
 FPS = 120
+# simulation ticks per second in fixed timestep mode, and the most ticks run to catch up in one frame
+TICK_RATE = 60
+MAX_CATCH_UP_TICKS = 5
 
 def initialize(width, height):
     global win_width, win_height
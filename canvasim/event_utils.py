@@ -0,0 +1,32 @@
+
+'''
+Event preprocessing shared by the canvas and gui main loops.
+'''
+
+import pygame
+
+
+def coalesce_motion(events: list[pygame.Event]) -> list[pygame.Event]:
+    '''merges runs of consecutive MOUSEMOTION events into one event with the summed rel and the latest pos and buttons.
+    Any other event ends a run, so the order of clicks, keys and motion is unchanged'''
+    result: list[pygame.Event] = []
+    run: list[pygame.Event] = []
+    for event in events:
+        if event.type == pygame.MOUSEMOTION:
+            run.append(event)
+            continue
+        if run:
+            result.append(merge_motion(run))
+            run = []
+        result.append(event)
+    if run:
+        result.append(merge_motion(run))
+    return result
+
+
+def merge_motion(run: list[pygame.Event]) -> pygame.Event:
+    if len(run) == 1:
+        return run[0]
+    rel_x = sum(event.rel[0] for event in run)
+    rel_y = sum(event.rel[1] for event in run)
+    return pygame.event.Event(pygame.MOUSEMOTION, {**run[-1].dict, 'rel': (rel_x, rel_y)})
@@ -15,4 +15,6 @@ from .primitives import (
 from .toggle_button import ToggleButton
 from .radio_button import RadioButton
 from .text_box import Textbox
+from .text_area import TextArea
+from .list_view import ListView
 from .slider import Slider
@@ -4,9 +4,11 @@ from typing import Any
 import pygame
 from pygame import Vector2
 
-from .gui_element import GuiElement, GuiEvent, GuiEventType, GuiAssets, calculate_layout
+from .gui_element import GuiElement, GuiEvent, GuiEventType, GuiAssets, RectIndex, LayoutEngine
 from .gui_globals import *
 from .radio_button import RadioButton
+from ..profiler import profiler
+from ..event_utils import coalesce_motion
 
 
 class GuiContext:
@@ -21,12 +23,38 @@ class GuiContext:
         self.focused_element: GuiElement = None
         self.font = kwargs.get('font', default_font)
         self.radio_groups: dict[Any, list[RadioButton]] = {}
+
+        # pointer events are routed through the rect index to the elements under the cursor,
+        # plus the elements that were hovered or pressed so they can clear their state
+        self.rect_index = RectIndex()
+        self.pointer_pos: tuple[int, int] = (0, 0)
+        self.hovered_elements: list[GuiElement] = []
+        self.pressed_elements: list[GuiElement] = []
+        self._held_buttons: set[int] = set()
+
+        # retained mode lays the elements out in panel coordinates and keeps them rendered on a panel surface,
+        # only dirty elements are redrawn and the panel is blitted at pos. opt-in, element positions are then
+        # relative to pos instead of the window
+        self.retained = kwargs.get('retained', False)
+        self.panel: pygame.Surface = None
+
+        # kept between frames so a size change of one element relayouts only what it displaces
+        self.layout_engine: LayoutEngine = None
+        self._damage: list[pygame.Rect] = []
     
     def set_layout(self, layout: list[list[GuiElement]]):
         self.assets = GuiAssets(pygame.font.SysFont(*self.font))
-        elements, size = calculate_layout(layout, self.pos, self.assets)
-        self.size = size
-        self.elements = elements
+        self.rect_index.clear()
+        origin = Vector2(0, 0) if self.retained else self.pos
+        self.layout_engine = LayoutEngine(layout, origin, self.assets, self.rect_index)
+        self.size = Vector2(self.layout_engine.size)
+        self.elements = self.layout_engine.elements
+        self.panel = None
+        self._damage = []
+        self.hovered_elements = []
+        self.pressed_elements = []
+        self._held_buttons.clear()
+        self.focused_element = None
 
         for element in self.elements:
             if isinstance(element, RadioButton):
@@ -53,9 +81,66 @@ class GuiContext:
             if element.key in values:
                 element.update(values[element.key])
 
+    def get_event_targets(self, event) -> list[GuiElement]:
+        '''elements that receive event: pointer events go to the elements under the cursor,
+        keyboard and text events to the focused element, anything else to every element'''
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            self.pointer_pos = event.pos
+            under = self.rect_index.query_point(event.pos)
+            targets = dict.fromkeys(under)
+            # elements the pointer left get the motion to clear their hover state
+            if event.type == pygame.MOUSEMOTION:
+                targets.update(dict.fromkeys(self.hovered_elements))
+                self.hovered_elements = under
+            # pressed elements keep receiving the pointer until the button is released, e.g. slider drags
+            targets.update(dict.fromkeys(self.pressed_elements))
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self._held_buttons.add(event.button)
+                self.pressed_elements = list(dict.fromkeys(self.pressed_elements + under))
+                # the focused element sees clicks outside of it to lose focus
+                if self.focused_element is not None:
+                    targets[self.focused_element] = None
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self._held_buttons.discard(event.button)
+                if not self._held_buttons:
+                    self.pressed_elements = []
+            if len(targets) < 2:
+                return list(targets)
+            return sorted(targets, key=self.rect_index.order.get)
+
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT, pygame.TEXTEDITING):
+            return [] if self.focused_element is None else [self.focused_element]
+
+        if event.type == pygame.MOUSEWHEEL:
+            return self.rect_index.query_point(self.pointer_pos)
+
+        return self.elements
+
+    def to_panel_event(self, event) -> pygame.Event:
+        '''pointer event moved into panel coordinates'''
+        if not self.retained or not hasattr(event, 'pos') or not self.pos:
+            return event
+        pos = (event.pos[0] - self.pos[0], event.pos[1] - self.pos[1])
+        return pygame.event.Event(event.type, {**event.dict, 'pos': pos})
+
+    def update_layout(self) -> None:
+        '''applies the size changes elements reported since the last call, e.g. a label whose text changed'''
+        if self.layout_engine is None or not self.layout_engine.is_invalid():
+            return
+        with profiler.phase('gui.layout'):
+            self.layout_engine.update()
+            self.size = Vector2(self.layout_engine.size)
+            damage = self.layout_engine.pop_damage()
+            # only the retained panel repaints damaged regions, drawing directly redraws every element
+            if self.retained:
+                self._damage.extend(damage)
+
     def handle_event(self, event) -> None:
         output_event: GuiEvent = None
-        for element in self.elements:
+        self.update_layout()
+        event = self.to_panel_event(event)
+        targets = self.get_event_targets(event)
+        for element in targets:
             output_event = element.handle_event(event)
             if output_event is not None:
                 self.gui_events.append(output_event)
@@ -72,29 +157,74 @@ class GuiContext:
                     if not is_any_updated:
                         output_event.caller.update(True)
         
-        # Check if focus changed
-        new_focused = None
-        for element in self.elements:
-            if hasattr(element, 'is_focused') and element.is_focused:
-                new_focused = element
-                break
-        
-        if new_focused != self.focused_element:
-            if self.focused_element:
-                self.focused_element.is_focused = False
-            self.focused_element = new_focused
-            if self.focused_element:
-                pygame.key.start_text_input()
-            else:
-                pygame.key.stop_text_input()
+        # Only clicks move the focus, and only the clicked and previously focused elements can hold it
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            new_focused = None
+            for element in targets:
+                if getattr(element, 'is_focused', False) and element is not self.focused_element:
+                    new_focused = element
+                    break
+            if new_focused is None and self.focused_element is not None and self.focused_element.is_focused:
+                new_focused = self.focused_element
+            self.set_focus(new_focused)
+
+    def set_focus(self, element: GuiElement) -> None:
+        '''moves keyboard focus to element, None clears it'''
+        if element is self.focused_element:
+            return
+        if self.focused_element is not None:
+            self.focused_element.is_focused = False
+            self.focused_element.mark_dirty()
+        self.focused_element = element
+        if element is not None:
+            element.is_focused = True
+            element.mark_dirty()
+            pygame.key.start_text_input()
+        else:
+            pygame.key.stop_text_input()
     
     def step(self):
-        for element in self.elements:
-            element.step()
+        with profiler.phase('gui.step'):
+            for element in self.elements:
+                element.step()
     
     def draw(self, win: pygame.Surface) -> None:
+        self.update_layout()
+        with profiler.phase('gui.draw'):
+            if not self.retained:
+                for element in self.elements:
+                    element.draw(win)
+                return
+            self.update_panel()
+            win.blit(self.panel, self.pos)
+
+    def update_panel(self) -> None:
+        '''redraws the dirty elements into the panel surface'''
+        if self.panel is None or self.panel.get_size() != (int(self.size[0]), int(self.size[1])):
+            # transparent where no element draws, pygame copies source pixels blitted onto fully transparent ones
+            # so antialiased text keeps its colors and blends with the world once the panel is blitted
+            self.panel = pygame.Surface(self.size, pygame.SRCALPHA)
+            for element in self.elements:
+                element.mark_dirty()
+            self._damage.clear()
+        # areas uncovered by moved or shrunk elements are cleared, and whatever overlaps them is redrawn
+        for rect in self._damage:
+            self.panel.fill((0, 0, 0, 0), rect)
+            for element in self.rect_index.query_rect(rect):
+                element.mark_dirty()
+        self._damage.clear()
+        redrawn = 0
         for element in self.elements:
-            element.draw(win)
+            if not element.is_dirty():
+                continue
+            rect = element.get_rect()
+            self.panel.set_clip(rect)
+            self.panel.fill((0, 0, 0, 0), rect)
+            element.draw(self.panel)
+            element.clear_dirty()
+            redrawn += 1
+        self.panel.set_clip(None)
+        profiler.count('gui_redrawn', redrawn)
 
 
 class GuiStandAlone(GuiContext):
@@ -102,6 +232,7 @@ class GuiStandAlone(GuiContext):
         super().__init__(**kwargs)
         self.title = kwargs.get('title', 'CanvaSim App')
         self.frame = pygame.NOFRAME if kwargs.get('no_frame', False) else 0
+        self.raw_motion = kwargs.get('raw_motion', False)
         
     def initialize(self, layout: list[list[GuiElement]], event_handler=None) -> None:
         pygame.init()
@@ -115,26 +246,37 @@ class GuiStandAlone(GuiContext):
 
         done = False
         while not done:
-            for event in pygame.event.get():
-                # handle events
-                self.handle_event(event)
-
-                if event.type == pygame.QUIT:
-                    done = True
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
+            profiler.begin_frame()
+            with profiler.phase('events'):
+                events = pygame.event.get()
+                if not self.raw_motion:
+                    events = coalesce_motion(events)
+                for event in events:
+                    # handle events
+                    self.handle_event(event)
+
+                    if event.type == pygame.QUIT:
                         done = True
-            
-            for event in self.get_gui_events():
-                values = self.get_values()
-                if self.event_handler:
-                    self.event_handler(event, values)
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_ESCAPE:
+                            done = True
+                        elif event.key == pygame.K_F3:
+                            profiler.toggle()
+                
+                for event in self.get_gui_events():
+                    values = self.get_values()
+                    if self.event_handler:
+                        self.event_handler(event, values)
 
             self.step()
             
             win.fill(COLOR_BACKGROUND)
             self.draw(win)
+            if profiler.show_hud:
+                profiler.draw_hud(win, (4, 4))
 
-            pygame.display.flip()
+            with profiler.phase('present'):
+                pygame.display.flip()
+            profiler.end_frame()
             clock.tick(60)
         pygame.quit()
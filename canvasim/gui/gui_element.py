@@ -18,6 +18,7 @@ class GuiEventType:
     BUTTON_CLICK = 0
     TOGGLE_BUTTON_CLICK = 1
     RADIO_BUTTON_CLICK = 2
+    LIST_SELECT = 3
 
 @dataclass
 class GuiEvent:
@@ -30,6 +31,10 @@ class GuiElement:
         self.key = kwargs.get('key', None)
         self.pos: Vector2 = Vector2()
         self.size: Vector2 = Vector2()
+        # set when the element looks different and has to be redrawn into the panel
+        self.dirty = True
+        # layout that positioned the element, told when its size changes
+        self.parent_layout: 'LayoutEngine' = None
 
     def initialize(self, assets: GuiAssets) -> None:
         ...
@@ -43,6 +48,26 @@ class GuiElement:
     def get_size(self) -> Vector2:
         ...
 
+    def get_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.pos, self.get_size())
+
+    def invalidate_layout(self) -> None:
+        '''call when the size of the element changed, the layout re-measures it on its next update'''
+        if self.parent_layout is not None:
+            self.parent_layout.invalidate(self)
+
+    def update_layout(self) -> None:
+        '''lays out nested elements before the element is measured again'''
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def is_dirty(self) -> bool:
+        return self.dirty
+
+    def clear_dirty(self) -> None:
+        self.dirty = False
+
     def handle_event(self, event: pygame.Event) -> GuiEvent:
         ...
     
@@ -64,52 +89,231 @@ class Filler(GuiElement):
     ...
 
 
-def calculate_layout(layout: list[list[GuiElement]], initial_pos: Vector2, assets: GuiAssets) -> tuple[list[GuiElement], Vector2]:
-    '''Calculate layout of gui elements and return list of elements with positions set and total size'''
-    elements: list[GuiElement] = []
-    x = initial_pos[0] + margin
-    y = initial_pos[1] + margin
-    w = margin
-    h = margin
-    for row in layout:
-        row_height = 0
-        x = initial_pos[0] + margin
-        row_width = 0
-        for element in row:
-            if isinstance(element, Filler):
-                continue
-            element.set_pos(Vector2(x, y))
-            element.initialize(assets)
-            row_height = max(row_height, element.get_size()[1])
+class RectIndex:
+    """Uniform grid over element rects, finds the elements under a point without testing every element"""
+    def __init__(self, cell_size: int = 64):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[GuiElement]] = {}
+        self.order: dict[GuiElement, int] = {}
+        self.rects: dict[GuiElement, pygame.Rect] = {}
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.order.clear()
+        self.rects.clear()
+
+    def _get_cells(self, rect: pygame.Rect) -> list[tuple[int, int]]:
+        size = self.cell_size
+        return [
+            (cx, cy)
+            for cx in range(rect.left // size, (rect.right - 1) // size + 1)
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1)
+        ]
+
+    def insert(self, element: GuiElement) -> None:
+        self.order[element] = len(self.order)
+        rect = element.get_rect()
+        self.rects[element] = rect
+        for cell in self._get_cells(rect):
+            self.cells.setdefault(cell, []).append(element)
+
+    def update(self, element: GuiElement) -> None:
+        '''moves element to the cells of its current rect, keeping its layout order'''
+        old_rect = self.rects.get(element)
+        if old_rect is None:
+            return
+        rect = element.get_rect()
+        if rect == old_rect:
+            return
+        for cell in self._get_cells(old_rect):
+            self.cells[cell].remove(element)
+        self.rects[element] = rect
+        order = self.order[element]
+        for cell in self._get_cells(rect):
+            elements = self.cells.setdefault(cell, [])
             elements.append(element)
-            x += element.get_size()[0] + margin
-            row_width += element.get_size()[0] + margin
-        y += row_height + margin
-        h += row_height + margin
-        w = max(w, row_width)
-
-    size = Vector2(w + margin, h)
-
-    # second pass for fillers
-    for row in layout:
-        row_filler_count = 0
-        row_space = 0
+            if len(elements) > 1 and self.order[elements[-2]] > order:
+                elements.sort(key=self.order.get)
+
+    def query_point(self, pos: tuple[float, float]) -> list[GuiElement]:
+        '''elements whose rect contains pos, in layout order'''
+        cell = (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+        return [element for element in self.cells.get(cell, ()) if element.get_rect().collidepoint(pos)]
+
+    def query_rect(self, rect: pygame.Rect) -> list[GuiElement]:
+        '''elements whose rect overlaps rect'''
+        found = {}
+        for cell in self._get_cells(rect):
+            for element in self.cells.get(cell, ()):
+                if element not in found and element.get_rect().colliderect(rect):
+                    found[element] = None
+        return list(found)
+
+
+class LayoutEngine:
+    """Row layout that keeps measured sizes and row metrics between passes.
+    Elements report size changes with invalidate_layout, update then re-measures only those elements
+    and moves only the elements their new sizes displaced"""
+    def __init__(self, layout: list[list[GuiElement]], initial_pos: Vector2, assets: GuiAssets, index: RectIndex = None, owner: GuiElement = None):
+        self.layout = layout
+        self.origin = Vector2(initial_pos)
+        self.assets = assets
+        self.index = index
+        # element whose size depends on this layout, told when it has to be laid out again
+        self.owner = owner
+        self.elements: list[GuiElement] = []
+        self.size = Vector2()
+
+        self._sizes: dict[GuiElement, Vector2] = {}
+        self._rows: dict[GuiElement, int] = {}
+        self._row_widths: list[float] = []
+        self._row_heights: list[float] = []
+        self._row_ys: list[float] = []
+        self._filler_rows: list[int] = []
+        self._invalid: dict[GuiElement, None] = {}
+        # panel areas uncovered by moved or shrunk elements since the last pop_damage
+        self._damage: list[pygame.Rect] = []
+        self._build()
+
+    def _build(self) -> None:
+        '''first pass, initializes and measures every element'''
+        y = self.origin[1] + margin
+        for row_number, row in enumerate(self.layout):
+            x = self.origin[0] + margin
+            row_height = 0
+            row_width = 0
+            has_filler = False
+            for element in row:
+                if isinstance(element, Filler):
+                    has_filler = True
+                    continue
+                element.set_pos(Vector2(x, y))
+                element.initialize(self.assets)
+                element.parent_layout = self
+                size = Vector2(element.get_size())
+                self._sizes[element] = size
+                self._rows[element] = row_number
+                self.elements.append(element)
+                row_height = max(row_height, size[1])
+                x += size[0] + margin
+                row_width += size[0] + margin
+            self._row_widths.append(row_width)
+            self._row_heights.append(row_height)
+            self._row_ys.append(y)
+            if has_filler:
+                self._filler_rows.append(row_number)
+            y += row_height + margin
+
+        self._update_size()
+        for row_number in self._filler_rows:
+            self._place_row(row_number)
+
+        if self.index is not None:
+            for element in self.elements:
+                self.index.insert(element)
+        self._damage.clear()
+
+    def _update_size(self) -> bool:
+        size = Vector2(max([margin, *self._row_widths]) + margin, margin + sum(self._row_heights) + margin * len(self._row_heights))
+        changed = size != self.size
+        self.size = size
+        return changed
+
+    def _place_row(self, row_number: int) -> None:
+        '''positions the elements of a row in one pass, every filler takes an equal share of the free width'''
+        row = self.layout[row_number]
+        filler_count = sum(1 for element in row if isinstance(element, Filler))
+        filler_width = 0
+        if filler_count:
+            filler_width = (self.size[0] - self._row_widths[row_number] - margin) / filler_count
+        x = self.origin[0] + margin
+        y = self._row_ys[row_number]
         for element in row:
             if isinstance(element, Filler):
-                row_filler_count += 1
-            else:
-                row_space += element.get_size()[0] + margin
-
-        row_empty_space = size[0] - row_space - margin
-        if row_filler_count == 0:
-            continue
-        
-        filler_width = row_empty_space / row_filler_count
-
-        for i, element in enumerate(row):
-            if isinstance(element, Filler) and i < len(row) - 1:
-                for next_element in row[i + 1:]:
-                    next_element.set_pos(Vector2(filler_width, 0), absolute=False)
-
-    return elements, size
-    
\ No newline at end of file
+                x += filler_width
+                continue
+            pos = Vector2(x, y)
+            if pos != element.pos:
+                self._damage.append(element.get_rect())
+                element.set_pos(pos)
+                element.mark_dirty()
+                if self.index is not None:
+                    self.index.update(element)
+            x += self._sizes[element][0] + margin
+
+    def invalidate(self, element: GuiElement) -> None:
+        self._invalid[element] = None
+        if self.owner is not None:
+            self.owner.invalidate_layout()
+
+    def is_invalid(self) -> bool:
+        return bool(self._invalid)
+
+    def update(self) -> bool:
+        '''re-measures the invalidated elements and moves the ones displaced by them, returns True if the total size changed'''
+        if not self._invalid:
+            return False
+        invalid = list(self._invalid)
+        self._invalid.clear()
+
+        changed_rows: set[int] = set()
+        for element in invalid:
+            row_number = self._rows.get(element)
+            if row_number is None:
+                continue
+            element.update_layout()
+            element.mark_dirty()
+            size = Vector2(element.get_size())
+            old_size = self._sizes[element]
+            if size == old_size:
+                continue
+            self._damage.append(pygame.Rect(element.pos, old_size))
+            self._sizes[element] = size
+            changed_rows.add(row_number)
+            if self.index is not None:
+                self.index.update(element)
+        if not changed_rows:
+            return False
+
+        first_moved_row = len(self.layout)
+        for row_number in changed_rows:
+            sizes = [self._sizes[element] for element in self.layout[row_number] if not isinstance(element, Filler)]
+            self._row_widths[row_number] = sum(size[0] + margin for size in sizes)
+            row_height = max([0, *(size[1] for size in sizes)])
+            if row_height != self._row_heights[row_number]:
+                self._row_heights[row_number] = row_height
+                first_moved_row = min(first_moved_row, row_number + 1)
+
+        # rows below a row whose height changed move vertically
+        for row_number in range(first_moved_row, len(self.layout)):
+            self._row_ys[row_number] = self._row_ys[row_number - 1] + self._row_heights[row_number - 1] + margin
+
+        size_changed = self._update_size()
+        rows_to_place = changed_rows | set(range(first_moved_row, len(self.layout)))
+        if size_changed:
+            # filler shares depend on the total width
+            rows_to_place.update(self._filler_rows)
+        for row_number in sorted(rows_to_place):
+            self._place_row(row_number)
+        return size_changed
+
+    def move(self, offset: Vector2) -> None:
+        '''shifts the origin and every element, used when the owner is moved'''
+        self.origin += offset
+        self._row_ys = [y + offset[1] for y in self._row_ys]
+        for element in self.elements:
+            element.set_pos(Vector2(offset), absolute=False)
+            if self.index is not None:
+                self.index.update(element)
+
+    def pop_damage(self) -> list[pygame.Rect]:
+        damage = self._damage
+        self._damage = []
+        return damage
+
+
+def calculate_layout(layout: list[list[GuiElement]], initial_pos: Vector2, assets: GuiAssets, index: RectIndex = None) -> tuple[list[GuiElement], Vector2]:
+    '''Calculate layout of gui elements and return list of elements with positions set and total size.
+    When index is given the final element rects are inserted into it. LayoutEngine keeps the state for incremental relayout'''
+    engine = LayoutEngine(layout, initial_pos, assets, index)
+    return engine.elements, engine.size
@@ -0,0 +1,303 @@
+
+from collections import OrderedDict
+from math import ceil
+from typing import Any, Callable, Sequence
+
+import pygame
+from pygame import Vector2
+
+from .gui_element import GuiElement, GuiAssets, GuiEvent, GuiEventType
+from .gui_globals import *
+from .primitives import Label
+from .color_utils import lighten
+
+ROW_CACHE_SIZE = 256
+WHEEL_ROWS = 3
+SCROLLBAR_WIDTH = 8
+# pointer position given to rows when the pointer is outside the visible rows, so they drop their hover state
+OUTSIDE_POS = (-(10 ** 6), -(10 ** 6))
+
+RowRenderer = Callable[[Any, int, GuiElement], GuiElement]
+
+
+def default_row_renderer(item: Any, index: int, row: GuiElement) -> GuiElement:
+    '''shows str(item) in a Label, reusing the recycled label when there is one'''
+    if row is None:
+        return Label(str(item))
+    row.text = str(item)
+    return row
+
+
+class ListView(GuiElement):
+    """Scrollable list over a sequence of items. Row widgets exist only for the visible rows and are recycled while scrolling,
+    rendered rows are cached as surfaces, so memory and frame time do not grow with the number of items.
+    row_renderer(item, index, row) returns the widget showing item, row is a recycled widget to reuse or None"""
+    def __init__(self, source: Sequence[Any], row_renderer: RowRenderer = None, width: int = 300, height: int = 300, row_height: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+        self.row_renderer = row_renderer or default_row_renderer
+        self.width = width
+        self.height = height
+        self.row_height = row_height
+        self.scroll_y = 0.0
+        self.selected: int = None
+        self.is_focused = False
+        self.assets: GuiAssets = None
+
+        # visible rows by item index, and released rows waiting to be reused
+        self._rows: dict[int, GuiElement] = {}
+        self._free_rows: list[GuiElement] = []
+        self._row_surfs: OrderedDict[int, pygame.Surface] = OrderedDict()
+        self._dragging_scrollbar = False
+
+    def initialize(self, assets: GuiAssets) -> None:
+        self.assets = assets
+        self._release_rows()
+        self._row_surfs.clear()
+        if self.row_height is None:
+            if len(self.source) > 0:
+                row = self._bind_row(0, None)
+                self.row_height = int(row.get_size()[1])
+                self._free_rows.append(row)
+            else:
+                self.row_height = assets.font.get_linesize() + 2 * margin
+
+    def get_size(self) -> Vector2:
+        return Vector2(self.width, self.height)
+
+    def get_value(self) -> Any:
+        return self.selected
+
+    def update(self, value: int) -> None:
+        '''selects the item at index value and scrolls it into view, None clears the selection'''
+        self.mark_dirty()
+        self.selected = value
+        if value is not None:
+            self.scroll_to(value)
+
+    def set_source(self, source: Sequence[Any]) -> None:
+        self.source = source
+        self.refresh()
+
+    def refresh(self, indices: list[int] = None) -> None:
+        '''call after items of the source changed, indices limits the refresh to those items'''
+        self.mark_dirty()
+        if indices is None:
+            self._release_rows()
+            self._row_surfs.clear()
+        else:
+            for index in indices:
+                self._row_surfs.pop(index, None)
+                row = self._rows.pop(index, None)
+                if row is not None:
+                    self._free_rows.append(row)
+        if self.selected is not None and self.selected >= len(self.source):
+            self.selected = None
+        self._scroll_by(0)
+
+    # geometry
+
+    def get_inner_rect(self) -> pygame.Rect:
+        '''area the rows are drawn in, left of the scrollbar'''
+        return pygame.Rect(self.pos.x + 1, self.pos.y + 1, self.width - SCROLLBAR_WIDTH - 2, self.height - 2)
+
+    def get_scrollbar_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.pos.x + self.width - SCROLLBAR_WIDTH - 1, self.pos.y + 1, SCROLLBAR_WIDTH, self.height - 2)
+
+    def get_thumb_rect(self) -> pygame.Rect:
+        track = self.get_scrollbar_rect()
+        content_height = len(self.source) * self.row_height
+        if content_height <= track.height:
+            return track.copy()
+        thumb_height = max(SCROLLBAR_WIDTH * 2, track.height * track.height / content_height)
+        top = track.top + (track.height - thumb_height) * self.scroll_y / self.get_max_scroll()
+        return pygame.Rect(track.left, top, track.width, thumb_height)
+
+    def get_max_scroll(self) -> float:
+        return max(0, len(self.source) * self.row_height - (self.height - 2))
+
+    def get_visible_range(self) -> range:
+        first = int(self.scroll_y // self.row_height)
+        last = ceil((self.scroll_y + self.height - 2) / self.row_height)
+        return range(first, min(last, len(self.source)))
+
+    def get_row_origin(self, index: int) -> Vector2:
+        return Vector2(self.pos.x + 1, self.pos.y + 1 + index * self.row_height - self.scroll_y)
+
+    def get_index_at(self, pos: tuple[float, float]) -> int:
+        '''item index under pos, None outside the rows'''
+        if not self.get_inner_rect().collidepoint(pos):
+            return None
+        index = int((pos[1] - self.pos.y - 1 + self.scroll_y) // self.row_height)
+        return index if 0 <= index < len(self.source) else None
+
+    def scroll_to(self, index: int) -> None:
+        '''scrolls the least needed to show the row at index'''
+        top = index * self.row_height
+        if top < self.scroll_y:
+            self._scroll_by(top - self.scroll_y)
+        elif top + self.row_height > self.scroll_y + self.height - 2:
+            self._scroll_by(top + self.row_height - (self.scroll_y + self.height - 2))
+
+    def _scroll_by(self, amount: float) -> None:
+        scroll_y = max(0.0, min(self.get_max_scroll(), self.scroll_y + amount))
+        if scroll_y != self.scroll_y:
+            self.scroll_y = scroll_y
+            self.mark_dirty()
+
+    # row recycling
+
+    def _bind_row(self, index: int, row: GuiElement) -> GuiElement:
+        row = self.row_renderer(self.source[index], index, row)
+        row.set_pos(Vector2(0, 0))
+        row.initialize(self.assets)
+        return row
+
+    def _release_rows(self) -> None:
+        self._free_rows.extend(self._rows.values())
+        self._rows.clear()
+
+    def _sync_rows(self) -> None:
+        '''binds widgets to the rows that became visible, reusing the ones of rows that scrolled out'''
+        visible = self.get_visible_range()
+        for index in [index for index in self._rows if index not in visible]:
+            self._free_rows.append(self._rows.pop(index))
+        for index in visible:
+            if index not in self._rows:
+                recycled = self._free_rows.pop() if self._free_rows else None
+                self._rows[index] = self._bind_row(index, recycled)
+
+    def _to_row_event(self, event, index: int) -> pygame.Event:
+        '''pointer event in the coordinates of the row at index'''
+        if not self.get_inner_rect().collidepoint(event.pos) or self._dragging_scrollbar:
+            pos = OUTSIDE_POS
+        else:
+            origin = self.get_row_origin(index)
+            pos = (event.pos[0] - origin.x, event.pos[1] - origin.y)
+        return pygame.event.Event(event.type, {**event.dict, 'pos': pos})
+
+    # events
+
+    def _select(self, index: int) -> GuiEvent:
+        index = max(0, min(len(self.source) - 1, index))
+        self.scroll_to(index)
+        if index == self.selected:
+            return None
+        self.mark_dirty()
+        self.selected = index
+        return GuiEvent(GuiEventType.LIST_SELECT, {'key': self.key, 'index': index}, self)
+
+    def handle_event(self, event) -> GuiEvent:
+        if self.assets is None:
+            return None
+        output_event = None
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.get_rect().collidepoint(event.pos):
+                if not self.is_focused:
+                    self.mark_dirty()
+                self.is_focused = True
+                if self.get_scrollbar_rect().collidepoint(event.pos):
+                    self._dragging_scrollbar = True
+                    self._drag_scrollbar(event.pos[1])
+            elif self.is_focused:
+                self.is_focused = False
+                self.mark_dirty()
+
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self._dragging_scrollbar = False
+
+        elif event.type == pygame.MOUSEMOTION and self._dragging_scrollbar:
+            self._drag_scrollbar(event.pos[1])
+
+        elif event.type == pygame.MOUSEWHEEL:
+            self._scroll_by(-event.y * WHEEL_ROWS * self.row_height)
+
+        elif event.type == pygame.KEYDOWN and self.is_focused and len(self.source) > 0:
+            page = max(1, len(self.get_visible_range()) - 1)
+            current = -1 if self.selected is None else self.selected
+            steps = {
+                pygame.K_UP: current - 1,
+                pygame.K_DOWN: current + 1,
+                pygame.K_PAGEUP: current - page,
+                pygame.K_PAGEDOWN: current + page,
+                pygame.K_HOME: 0,
+                pygame.K_END: len(self.source) - 1,
+            }
+            if event.key in steps:
+                output_event = self._select(steps[event.key])
+
+        self._sync_rows()
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            for index, row in self._rows.items():
+                row_event = row.handle_event(self._to_row_event(event, index))
+                if row_event is not None:
+                    output_event = row_event
+
+            # a click on a row selects it, unless the row widget reacted to the click itself
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and output_event is None:
+                index = self.get_index_at(event.pos)
+                if index is not None and not self._dragging_scrollbar:
+                    output_event = self._select(index)
+        return output_event
+
+    def _drag_scrollbar(self, y: float) -> None:
+        track = self.get_scrollbar_rect()
+        thumb = self.get_thumb_rect()
+        if track.height <= thumb.height:
+            return
+        factor = (y - track.top - thumb.height / 2) / (track.height - thumb.height)
+        self._scroll_by(factor * self.get_max_scroll() - self.scroll_y)
+
+    def step(self) -> None:
+        for row in self._rows.values():
+            row.step()
+
+    # drawing
+
+    def is_dirty(self) -> bool:
+        return self.dirty or any(row.is_dirty() for row in self._rows.values())
+
+    def clear_dirty(self) -> None:
+        self.dirty = False
+        for row in self._rows.values():
+            row.clear_dirty()
+
+    def _get_row_surf(self, index: int, row: GuiElement) -> pygame.Surface:
+        '''rendered row, drawn again only when its widget changed'''
+        surf = self._row_surfs.get(index)
+        if surf is not None and not row.is_dirty():
+            self._row_surfs.move_to_end(index)
+            return surf
+        surf = pygame.Surface((self.width - SCROLLBAR_WIDTH - 2, self.row_height), pygame.SRCALPHA)
+        row.draw(surf)
+        row.clear_dirty()
+        self._row_surfs[index] = surf
+        self._row_surfs.move_to_end(index)
+        if len(self._row_surfs) > ROW_CACHE_SIZE:
+            self._row_surfs.popitem(last=False)
+        return surf
+
+    def draw(self, win: pygame.Surface) -> None:
+        if self.assets is None:
+            return
+        self._sync_rows()
+        pygame.draw.rect(win, COLOR_BACKGROUND, (self.pos, self.get_size()))
+
+        previous_clip = win.get_clip()
+        win.set_clip(self.get_inner_rect().clip(previous_clip))
+        for index, row in self._rows.items():
+            origin = self.get_row_origin(index)
+            if index == self.selected:
+                color = COLOR_SELECTED if self.is_focused else COLOR_TOGGLE_BACK_ON
+                pygame.draw.rect(win, color, (origin, (self.width - SCROLLBAR_WIDTH - 2, self.row_height)))
+            win.blit(self._get_row_surf(index, row), origin)
+        win.set_clip(previous_clip)
+
+        # Draw scrollbar
+        pygame.draw.rect(win, COLOR_SLIDER_EMPTY, self.get_scrollbar_rect())
+        thumb_color = lighten(COLOR_SLIDER_FULL, 20) if self._dragging_scrollbar else COLOR_SLIDER_FULL
+        pygame.draw.rect(win, thumb_color, self.get_thumb_rect())
+
+        # Draw border
+        pygame.draw.rect(win, COLOR_LABEL, (self.pos, self.get_size()), 1)
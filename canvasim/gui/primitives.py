@@ -3,7 +3,7 @@
 import pygame
 from pygame import Vector2
 
-from .gui_element import GuiElement, GuiAssets, GuiEvent, GuiEventType, calculate_layout
+from .gui_element import GuiElement, GuiAssets, GuiEvent, GuiEventType, LayoutEngine
 from .gui_globals import *
 
 CHECK_BOX_SIZE = Vector2(50, 25)
@@ -15,8 +15,10 @@ class Label(GuiElement):
         self.text = text
         self.surf: pygame.Surface = None
         self.width = kwargs.get('width', None)
+        self.assets: GuiAssets = None
 
     def initialize(self, assets: GuiAssets) -> None:
+        self.assets = assets
         font_surf = assets.font.render(self.text, True, COLOR_LABEL)
         width = font_surf.get_width()
         if self.width is not None:
@@ -27,6 +29,15 @@ class Label(GuiElement):
     def get_size(self) -> Vector2:
         return Vector2(self.surf.get_size()) + Vector2(margin, margin) * 2
 
+    def update(self, value: str) -> None:
+        '''changes the text, the layout re-measures only this label'''
+        self.text = str(value)
+        if self.assets is None:
+            return
+        self.initialize(self.assets)
+        self.mark_dirty()
+        self.invalidate_layout()
+
     def draw(self, win: pygame.Surface) -> None:
         # pygame.draw.rect(win, COLOR_BACKGROUND, (self.pos, self.get_size()))
         win.blit(self.surf, self.pos + Vector2(margin, margin))
@@ -41,30 +52,44 @@ class Button(GuiElement):
             self.key = self.text
         self.elements: list[GuiElement] = []
         self.layout = layout
+        self.layout_engine: LayoutEngine = None
         self.is_hovered = False
 
     def set_pos(self, pos: Vector2, absolute: bool=True) -> None:
-        if absolute:
-            self.pos = pos
-        else:
-            self.pos += pos
-            for element in self.elements:
-                element.set_pos(pos, absolute)
+        offset = pos - self.pos if absolute else Vector2(pos)
+        self.pos = self.pos + offset
+        if self.layout_engine is not None and offset:
+            self.layout_engine.move(offset)
 
     def initialize(self, assets: GuiAssets) -> None:
         if self.layout is None:
             self.layout = [[Label(self.text)]]
-        elements, size = calculate_layout(self.layout, self.pos, assets)
-        self.size = size
-        self.elements = elements
+        self.layout_engine = LayoutEngine(self.layout, self.pos, assets, owner=self)
+        self.size = Vector2(self.layout_engine.size)
+        self.elements = self.layout_engine.elements
+
+    def update_layout(self) -> None:
+        if self.layout_engine.update():
+            self.size = Vector2(self.layout_engine.size)
+    
+    def is_dirty(self) -> bool:
+        return self.dirty or any(element.is_dirty() for element in self.elements)
+
+    def clear_dirty(self) -> None:
+        self.dirty = False
+        for element in self.elements:
+            element.clear_dirty()
     
     def handle_event(self, event) -> GuiEvent:
         if event.type == pygame.MOUSEMOTION:
+            was_hovered = self.is_hovered
             self.is_hovered = False
             mouse_pos = Vector2(event.pos)
             rect = pygame.Rect(self.pos, self.get_size())
             if rect.collidepoint(mouse_pos):
                 self.is_hovered = True
+            if self.is_hovered != was_hovered:
+                self.mark_dirty()
 
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.is_hovered:
@@ -114,19 +139,29 @@ class ToggleableElement(GuiElement):
     
     def update(self, value: bool) -> None:
         self.is_toggled = value
+        self.mark_dirty()
+
+    def set_hovered(self, is_hovered: bool) -> None:
+        if is_hovered != self.is_hovered:
+            self.is_hovered = is_hovered
+            self.mark_dirty()
 
     def step(self) -> None:
         target = 1.0 if self.is_toggled else 0.0
+        if self.animation_factor == target:
+            return
         if abs(target - self.animation_factor) < 0.01:
             self.animation_factor = target
         else:
             self.animation_factor = self.animation_factor + (target - self.animation_factor) * 0.2
+        self.mark_dirty()
 
     def redraw(self) -> None:
         ...
 
     def draw(self, win: pygame.Surface) -> None:
-        self.redraw()
+        if self.dirty:
+            self.redraw()
         win.blit(self.check_surface, self.pos)
 
 
@@ -144,16 +179,16 @@ class ToggleableButton(Button):
 
     def update(self, value: bool) -> None:
         self.is_toggled = value
-        self.check_element.is_toggled = value
+        self.check_element.update(value)
 
     def handle_event(self, event):
         output_event = super().handle_event(event)
         if output_event is not None:
             if self.is_hovered:
                 self.is_toggled = not self.is_toggled
-                self.check_element.is_toggled = self.is_toggled
+                self.check_element.update(self.is_toggled)
                 output_event = GuiEvent(GuiEventType.TOGGLE_BUTTON_CLICK, {'key': self.key}, self)
-        self.check_element.is_hovered = self.is_hovered
+        self.check_element.set_hovered(self.is_hovered)
         return output_event
     
     def draw(self, win: pygame.Surface) -> None:
@@ -32,6 +32,7 @@ class Slider(GuiElement):
     
     def update(self, value: float) -> None:
         self.value = max(self.min_value, min(self.max_value, value))
+        self.redraw()
 
     def handle_event(self, event) -> GuiEvent:
         self.was_hovering = self.is_hovered
@@ -63,6 +64,7 @@ class Slider(GuiElement):
         return None
 
     def redraw(self) -> None:
+        self.mark_dirty()
         self.surf.fill((0, 0, 0, 0))
         pos_0 = Vector2(SLIDER_SIZE[1] * 0.5, SLIDER_SIZE[1] * 0.5)
         pos_1 = Vector2(SLIDER_SIZE[0] - SLIDER_SIZE[1] * 0.5, SLIDER_SIZE[1] * 0.5)
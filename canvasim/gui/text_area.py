@@ -0,0 +1,351 @@
+
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator
+
+import pygame
+from pygame import Vector2
+
+from .gui_element import GuiElement, GuiAssets, GuiEvent
+from .gui_globals import *
+
+LINE_CACHE_SIZE = 512
+WHEEL_LINES = 3
+
+
+class GapBuffer:
+    """Sequence with a movable gap, insertions and deletions next to the previous edit are O(1) amortized"""
+    def __init__(self, items: Iterable[Any] = (), capacity: int = 64):
+        self._data: list[Any] = list(items)
+        self._gap_start = len(self._data)
+        self._data.extend([None] * capacity)
+        self._gap_end = len(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data) - (self._gap_end - self._gap_start)
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += len(self)
+        if index < self._gap_start:
+            return self._data[index]
+        return self._data[index + self._gap_end - self._gap_start]
+
+    def __setitem__(self, index: int, item: Any) -> None:
+        if index < 0:
+            index += len(self)
+        if index < self._gap_start:
+            self._data[index] = item
+        else:
+            self._data[index + self._gap_end - self._gap_start] = item
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self._data[:self._gap_start]
+        yield from self._data[self._gap_end:]
+
+    def slice(self, start: int, end: int) -> list[Any]:
+        return [self[i] for i in range(start, min(end, len(self)))]
+
+    def _move_gap(self, index: int) -> None:
+        data = self._data
+        if index < self._gap_start:
+            count = self._gap_start - index
+            data[self._gap_end - count:self._gap_end] = data[index:self._gap_start]
+            self._gap_start -= count
+            self._gap_end -= count
+        elif index > self._gap_start:
+            count = index - self._gap_start
+            data[self._gap_start:self._gap_start + count] = data[self._gap_end:self._gap_end + count]
+            self._gap_start += count
+            self._gap_end += count
+
+    def _grow(self, needed: int) -> None:
+        '''doubles the gap until needed items fit'''
+        extra = max(needed, len(self._data))
+        self._data[self._gap_end:self._gap_end] = [None] * extra
+        self._gap_end += extra
+
+    def insert(self, index: int, items: list[Any]) -> None:
+        self._move_gap(index)
+        if self._gap_end - self._gap_start < len(items):
+            self._grow(len(items))
+        self._data[self._gap_start:self._gap_start + len(items)] = items
+        self._gap_start += len(items)
+
+    def delete(self, index: int, count: int = 1) -> None:
+        self._move_gap(index)
+        count = min(count, len(self) - index)
+        self._data[self._gap_end:self._gap_end + count] = [None] * count
+        self._gap_end += count
+
+
+class TextArea(GuiElement):
+    """Multi-line text editor. Lines live in a gap buffer and only the visible lines are rendered,
+    cursor and selection behave like Textbox with positions as (line, column)"""
+    def __init__(self, initial_text: str = "", width: int = 400, height: int = 300, **kwargs):
+        super().__init__(**kwargs)
+        self.lines = GapBuffer(str(initial_text).split('\n'))
+        self.cursor_pos = (len(self.lines) - 1, len(self.lines[-1]))
+        self.selection_start = self.cursor_pos
+        self.selection_end = self.cursor_pos
+        self.is_focused = False
+        self.cursor_blink_timer = 0
+        self.width = width
+        self.height = height
+        self.font: pygame.Font = None
+        self.line_height = 0
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self._line_surfs: OrderedDict[str, pygame.Surface] = OrderedDict()
+
+    def initialize(self, assets: GuiAssets) -> None:
+        self.font = assets.font
+        self.line_height = self.font.get_linesize()
+        self._line_surfs.clear()
+
+    def get_size(self) -> Vector2:
+        return Vector2(self.width, self.height)
+
+    def get_text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def get_value(self):
+        return self.get_text()
+
+    def update(self, value: str) -> None:
+        self.mark_dirty()
+        self.lines = GapBuffer(str(value).split('\n'))
+        self.cursor_pos = (len(self.lines) - 1, len(self.lines[-1]))
+        self.selection_start = self.cursor_pos
+        self.selection_end = self.cursor_pos
+        if self.font is not None:
+            self._scroll_to_cursor()
+
+    # editing
+
+    def _get_selection(self) -> tuple[tuple[int, int], tuple[int, int]]:
+        return min(self.selection_start, self.selection_end), max(self.selection_start, self.selection_end)
+
+    def _insert(self, pos: tuple[int, int], text: str) -> tuple[int, int]:
+        '''inserts text at pos, returns the position after it'''
+        line_index, column = pos
+        line = self.lines[line_index]
+        head, tail = line[:column], line[column:]
+        parts = text.split('\n')
+        if len(parts) == 1:
+            self.lines[line_index] = head + text + tail
+            return line_index, column + len(text)
+        self.lines[line_index] = head + parts[0]
+        self.lines.insert(line_index + 1, parts[1:-1] + [parts[-1] + tail])
+        return line_index + len(parts) - 1, len(parts[-1])
+
+    def _delete(self, start: tuple[int, int], end: tuple[int, int]) -> None:
+        '''deletes the text between two positions, start before end'''
+        if start[0] == end[0]:
+            line = self.lines[start[0]]
+            self.lines[start[0]] = line[:start[1]] + line[end[1]:]
+            return
+        self.lines[start[0]] = self.lines[start[0]][:start[1]] + self.lines[end[0]][end[1]:]
+        self.lines.delete(start[0] + 1, end[0] - start[0])
+
+    def _move(self, pos: tuple[int, int], extend: bool) -> None:
+        self.cursor_pos = pos
+        if not extend:
+            self.selection_start = pos
+        self.selection_end = pos
+
+    def _step_left(self, pos: tuple[int, int]) -> tuple[int, int]:
+        line_index, column = pos
+        if column > 0:
+            return line_index, column - 1
+        if line_index > 0:
+            return line_index - 1, len(self.lines[line_index - 1])
+        return pos
+
+    def _step_right(self, pos: tuple[int, int]) -> tuple[int, int]:
+        line_index, column = pos
+        if column < len(self.lines[line_index]):
+            return line_index, column + 1
+        if line_index < len(self.lines) - 1:
+            return line_index + 1, 0
+        return pos
+
+    def _step_vertical(self, pos: tuple[int, int], lines: int) -> tuple[int, int]:
+        '''moves pos by lines, keeping the x position as close as the target line allows'''
+        line_index = max(0, min(len(self.lines) - 1, pos[0] + lines))
+        x = self.font.size(self.lines[pos[0]][:pos[1]])[0]
+        return line_index, self.get_column_at(line_index, x)
+
+    # geometry
+
+    def get_column_at(self, line_index: int, x: float) -> int:
+        '''column of the boundary left of x in line, binary search over prefix widths'''
+        line = self.lines[line_index]
+        low, high = 0, len(line) + 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.font.size(line[:middle])[0] > x:
+                high = middle
+            else:
+                low = middle + 1
+        return max(0, min(len(line), low - 1))
+
+    def get_pos_at(self, screen_pos: tuple[float, float]) -> tuple[int, int]:
+        line_index = int((screen_pos[1] - self.pos.y - margin + self.scroll_y) // self.line_height)
+        line_index = max(0, min(len(self.lines) - 1, line_index))
+        return line_index, self.get_column_at(line_index, screen_pos[0] - self.pos.x - margin + self.scroll_x)
+
+    def get_visible_lines(self) -> range:
+        first = int(self.scroll_y // self.line_height)
+        last = int((self.scroll_y + self.height - 2 * margin) // self.line_height) + 1
+        return range(first, min(last, len(self.lines)))
+
+    def _scroll_to_cursor(self) -> None:
+        '''keeps the cursor inside the visible area'''
+        inner_width = self.width - 2 * margin - 1
+        inner_height = self.height - 2 * margin
+        line_index, column = self.cursor_pos
+        cursor_y = line_index * self.line_height
+        if cursor_y < self.scroll_y:
+            self.scroll_y = cursor_y
+        if cursor_y + self.line_height > self.scroll_y + inner_height:
+            self.scroll_y = cursor_y + self.line_height - inner_height
+        cursor_x = self.font.size(self.lines[line_index][:column])[0]
+        if cursor_x - self.scroll_x > inner_width:
+            self.scroll_x = cursor_x - inner_width
+        if cursor_x < self.scroll_x:
+            self.scroll_x = cursor_x
+
+    def _scroll_by(self, lines: int) -> None:
+        max_scroll = max(0, len(self.lines) * self.line_height - (self.height - 2 * margin))
+        self.scroll_y = max(0, min(max_scroll, self.scroll_y + lines * self.line_height))
+
+    # events
+
+    def handle_event(self, event) -> GuiEvent:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.mark_dirty()
+            if self.get_rect().collidepoint(event.pos):
+                self.is_focused = True
+                self._move(self.get_pos_at(event.pos), extend=False)
+                self.cursor_blink_timer = 0
+            else:
+                self.is_focused = False
+
+        if event.type == pygame.MOUSEWHEEL:
+            self.mark_dirty()
+            self._scroll_by(-event.y * WHEEL_LINES)
+            return None
+
+        if not self.is_focused:
+            return None
+
+        if event.type == pygame.TEXTINPUT:
+            self.mark_dirty()
+            self._move(self._insert(self.cursor_pos, event.text), extend=False)
+
+        elif event.type == pygame.KEYDOWN:
+            self.mark_dirty()
+            extend = bool(event.mod & pygame.KMOD_SHIFT)
+            start, end = self._get_selection()
+            if event.key == pygame.K_BACKSPACE:
+                if start != end:
+                    self._delete(start, end)
+                    self._move(start, extend=False)
+                else:
+                    previous = self._step_left(self.cursor_pos)
+                    self._delete(previous, self.cursor_pos)
+                    self._move(previous, extend=False)
+            elif event.key == pygame.K_DELETE:
+                if start != end:
+                    self._delete(start, end)
+                    self._move(start, extend=False)
+                else:
+                    self._delete(self.cursor_pos, self._step_right(self.cursor_pos))
+                    self._move(self.cursor_pos, extend=False)
+            elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                self._move(self._insert(self.cursor_pos, '\n'), extend=False)
+            elif event.key == pygame.K_LEFT:
+                self._move(self._step_left(self.cursor_pos), extend)
+            elif event.key == pygame.K_RIGHT:
+                self._move(self._step_right(self.cursor_pos), extend)
+            elif event.key == pygame.K_UP:
+                self._move(self._step_vertical(self.cursor_pos, -1), extend)
+            elif event.key == pygame.K_DOWN:
+                self._move(self._step_vertical(self.cursor_pos, 1), extend)
+            elif event.key == pygame.K_PAGEUP:
+                self._move(self._step_vertical(self.cursor_pos, -len(self.get_visible_lines())), extend)
+            elif event.key == pygame.K_PAGEDOWN:
+                self._move(self._step_vertical(self.cursor_pos, len(self.get_visible_lines())), extend)
+            elif event.key == pygame.K_HOME:
+                self._move((self.cursor_pos[0], 0), extend)
+            elif event.key == pygame.K_END:
+                self._move((self.cursor_pos[0], len(self.lines[self.cursor_pos[0]])), extend)
+            elif event.key == pygame.K_a and (event.mod & pygame.KMOD_CTRL):
+                self.selection_start = (0, 0)
+                self.cursor_pos = (len(self.lines) - 1, len(self.lines[-1]))
+                self.selection_end = self.cursor_pos
+            self.cursor_blink_timer = 0
+
+        self._scroll_to_cursor()
+        return None
+
+    def step(self) -> None:
+        self.cursor_blink_timer += 1
+        # the cursor shows or hides
+        if self.is_focused and self.cursor_blink_timer % 30 == 0:
+            self.mark_dirty()
+
+    # drawing
+
+    def _get_line_surf(self, line: str) -> pygame.Surface:
+        '''rendered line, cached by content so scrolling and editing other lines do not re-render it'''
+        surf = self._line_surfs.get(line)
+        if surf is not None:
+            self._line_surfs.move_to_end(line)
+            return surf
+        surf = self.font.render(line, True, COLOR_LABEL)
+        self._line_surfs[line] = surf
+        if len(self._line_surfs) > LINE_CACHE_SIZE:
+            self._line_surfs.popitem(last=False)
+        return surf
+
+    def draw(self, win: pygame.Surface) -> None:
+        # Draw background
+        back_color = COLOR_BACKGROUND if not self.is_focused else COLOR_TEXTBOX_BG_FOCUSED
+        pygame.draw.rect(win, back_color, (self.pos, self.get_size()))
+
+        # Draw border
+        pygame.draw.rect(win, COLOR_LABEL, (self.pos, self.get_size()), 1)
+
+        previous_clip = win.get_clip()
+        clip_rect = pygame.Rect(self.pos.x + margin, self.pos.y + margin, self.width - 2 * margin, self.height - 2 * margin)
+        win.set_clip(clip_rect.clip(previous_clip))
+
+        origin_x = self.pos.x + margin - self.scroll_x
+        origin_y = self.pos.y + margin - self.scroll_y
+        start, end = self._get_selection()
+        for line_index in self.get_visible_lines():
+            line = self.lines[line_index]
+            y = origin_y + line_index * self.line_height
+
+            # Draw selection
+            if self.is_focused and start != end and start[0] <= line_index <= end[0]:
+                start_x = self.font.size(line[:start[1]])[0] if line_index == start[0] else 0
+                if line_index == end[0]:
+                    end_x = self.font.size(line[:end[1]])[0]
+                else:
+                    # selected line breaks show as a space
+                    end_x = self.font.size(line)[0] + self.font.size(' ')[0]
+                pygame.draw.rect(win, COLOR_SELECTED, (origin_x + start_x, y, end_x - start_x, self.line_height))
+
+            if line:
+                win.blit(self._get_line_surf(line), (origin_x, y))
+
+        # Draw cursor
+        if self.is_focused and self.cursor_blink_timer % 60 < 30:  # Blink every 30 frames
+            line_index, column = self.cursor_pos
+            cursor_x = origin_x + self.font.size(self.lines[line_index][:column])[0]
+            cursor_y = origin_y + line_index * self.line_height
+            pygame.draw.line(win, COLOR_LABEL, (cursor_x, cursor_y), (cursor_x, cursor_y + self.line_height - 1))
+
+        win.set_clip(previous_clip)
@@ -1,14 +1,47 @@
 
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+import weakref
+
 import pygame
 from pygame import Vector2
 
 from .gui_element import GuiElement, GuiAssets, GuiEvent
 from .gui_globals import *
 
+# advance of a character following another one, per font. Keyed by the pair so kerning is included
+_advance_cache: weakref.WeakKeyDictionary[pygame.Font, dict[str, int]] = weakref.WeakKeyDictionary()
+
+
+def get_advances(font: pygame.Font, text: str, previous: str = '') -> list[int]:
+    '''pixel advance of every character of text, previous is the character before text.
+    Prefix sums approximate font.size, shaping and subpixel positioning make the exact width context dependent'''
+    cache = _advance_cache.get(font)
+    if cache is None:
+        cache = _advance_cache[font] = {}
+    advances = []
+    for char in text:
+        pair = previous + char
+        advance = cache.get(pair)
+        if advance is None:
+            advance = font.size(pair)[0] - (font.size(previous)[0] if previous else 0)
+            cache[pair] = advance
+        advances.append(advance)
+        previous = char
+    return advances
+
 
 class Textbox(GuiElement):
     def __init__(self, initial_text: str="", width: int=200, **kwargs):
         super().__init__(**kwargs)
+        # per character advances and their prefix sums, offsets[i] is the width of text[:i]
+        self._widths: list[int] = []
+        self._offsets: list[int] = [0]
+        # rendered visible slice of the text and its (start, end) character range
+        self._text_surf: pygame.Surface = None
+        self._text_range: tuple[int, int] = None
+        self.font = None
+        self._text = ''
         self.text = str(initial_text)
         self.cursor_pos = len(self.text)
         self.selection_start = self.cursor_pos
@@ -17,27 +50,101 @@ class Textbox(GuiElement):
         self.cursor_blink_timer = 0
         self.width = width
         self.height = 30  # Fixed height for now
-        self.font = None
         self.scroll_x = 0
 
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._text = value
+        self._rebuild_offsets()
+
     def initialize(self, assets: GuiAssets) -> None:
         self.font = assets.font
+        self._rebuild_offsets()
+
+    def _rebuild_offsets(self) -> None:
+        self._text_surf = None
+        if self.font is None:
+            return
+        self._widths = get_advances(self.font, self._text)
+        self._offsets = list(accumulate(self._widths, initial=0))
+
+    def _replace(self, start: int, end: int, new_text: str) -> None:
+        '''replaces text[start:end], only the advances from start onwards are updated'''
+        self._text = self._text[:start] + new_text + self._text[end:]
+        self._text_surf = None
+        if self.font is None:
+            return
+        # the character after the edit has a new neighbour, its kerning may change
+        changed_end = min(len(self._text), start + len(new_text) + 1)
+        previous = self._text[start - 1] if start > 0 else ''
+        self._widths[start:end + 1] = get_advances(self.font, self._text[start:changed_end], previous)
+        self._offsets[start:] = accumulate(self._widths[start:], initial=self._offsets[start])
+
+    def _get_window(self) -> tuple[int, int]:
+        '''range of characters inside the scroll window'''
+        inner_width = self.width - 2 * margin
+        start = max(0, bisect_right(self._offsets, self.scroll_x) - 1)
+        end = min(len(self.text), bisect_left(self._offsets, self.scroll_x + inner_width) + 1)
+        return start, end
+
+    def get_text_x(self, index: int) -> int:
+        '''x of the boundary before text[index] relative to the text origin. Inside the window it is measured
+        on the rendered slice so it lines up with the glyphs, elsewhere the prefix index is used'''
+        start, end = self._get_window()
+        if start <= index <= end:
+            return self._offsets[start] + self.font.size(self.text[start:index])[0]
+        return self._offsets[index]
 
     def get_size(self) -> Vector2:
         return Vector2(self.width, self.height)
 
     def get_cursor_index_from_pos(self, mouse_x: int) -> int:
-        # Calculate cursor position from mouse x
-        for i in range(len(self.text) + 1):
-            text_width = self.font.size(self.text[:i])[0]
-            if text_width > mouse_x - self.pos.x + self.scroll_x:
-                return max(0, i - 1)
-        return len(self.text)
+        # first boundary right of the mouse, found by binary search
+        target = mouse_x - self.pos.x + self.scroll_x
+        start, end = self._get_window()
+        # the window is bounded by its measured width, the summed advances can fall short of it
+        if self._offsets[start] <= target < self.get_text_x(end):
+            low, high = start, end + 1
+            while low < high:
+                middle = (low + high) // 2
+                if self.get_text_x(middle) > target:
+                    high = middle
+                else:
+                    low = middle + 1
+            index = low
+        else:
+            index = bisect_right(self._offsets, target)
+        return max(0, min(len(self.text), index - 1))
+
+    def _scroll_to_cursor(self) -> None:
+        '''keeps the cursor inside the visible window'''
+        # one pixel less so a cursor at the right end stays inside the clip
+        inner_width = self.width - 2 * margin - 1
+        cursor_x = self._offsets[self.cursor_pos]
+        if cursor_x - self.scroll_x > inner_width:
+            self.scroll_x = cursor_x - inner_width
+        if cursor_x < self.scroll_x:
+            self.scroll_x = cursor_x
+        self.scroll_x = max(0, min(self.scroll_x, self._offsets[-1] - inner_width))
+        # the measured position can differ from the index by a few pixels, and moving the window moves it again
+        for _ in range(4):
+            cursor_x = self.get_text_x(self.cursor_pos)
+            if cursor_x - self.scroll_x > inner_width:
+                self.scroll_x = cursor_x - inner_width
+            elif cursor_x < self.scroll_x:
+                self.scroll_x = cursor_x
+            else:
+                break
 
     def handle_event(self, event) -> GuiEvent:
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             mouse_pos = Vector2(event.pos)
             rect = pygame.Rect(self.pos, self.get_size())
+            self.mark_dirty()
             if rect.collidepoint(mouse_pos):
                 self.is_focused = True
                 self.cursor_pos = self.get_cursor_index_from_pos(mouse_pos.x)
@@ -50,9 +157,12 @@ class Textbox(GuiElement):
         if not self.is_focused:
             return None
 
+        if event.type in (pygame.TEXTINPUT, pygame.KEYDOWN):
+            self.mark_dirty()
+
         if event.type == pygame.TEXTINPUT:
             # Insert text at cursor
-            self.text = self.text[:self.cursor_pos] + event.text + self.text[self.cursor_pos:]
+            self._replace(self.cursor_pos, self.cursor_pos, event.text)
             self.cursor_pos += len(event.text)
             self.selection_start = self.cursor_pos
             self.selection_end = self.cursor_pos
@@ -63,10 +173,10 @@ class Textbox(GuiElement):
                     # Delete selection
                     start = min(self.selection_start, self.selection_end)
                     end = max(self.selection_start, self.selection_end)
-                    self.text = self.text[:start] + self.text[end:]
+                    self._replace(start, end, '')
                     self.cursor_pos = start
                 elif self.cursor_pos > 0:
-                    self.text = self.text[:self.cursor_pos - 1] + self.text[self.cursor_pos:]
+                    self._replace(self.cursor_pos - 1, self.cursor_pos, '')
                     self.cursor_pos -= 1
                 self.selection_start = self.cursor_pos
                 self.selection_end = self.cursor_pos
@@ -74,10 +184,10 @@ class Textbox(GuiElement):
                 if self.selection_start != self.selection_end:
                     start = min(self.selection_start, self.selection_end)
                     end = max(self.selection_start, self.selection_end)
-                    self.text = self.text[:start] + self.text[end:]
+                    self._replace(start, end, '')
                     self.cursor_pos = start
                 elif self.cursor_pos < len(self.text):
-                    self.text = self.text[:self.cursor_pos] + self.text[self.cursor_pos + 1:]
+                    self._replace(self.cursor_pos, self.cursor_pos + 1, '')
                 self.selection_start = self.cursor_pos
                 self.selection_end = self.cursor_pos
             elif event.key == pygame.K_LEFT:
@@ -114,19 +224,34 @@ class Textbox(GuiElement):
                 self.cursor_pos = len(self.text)
             self.cursor_blink_timer = 0
 
+        self._scroll_to_cursor()
         return None
 
     def step(self) -> None:
         self.cursor_blink_timer += 1
+        # the cursor shows or hides
+        if self.is_focused and self.cursor_blink_timer % 30 == 0:
+            self.mark_dirty()
 
     def get_value(self):
         return self.text
     
     def update(self, value: str) -> None:
+        self.mark_dirty()
         self.text = value
         self.cursor_pos = len(self.text)
         self.selection_start = self.cursor_pos
         self.selection_end = self.cursor_pos
+        if self.font is not None:
+            self._scroll_to_cursor()
+
+    def _get_visible_text(self) -> tuple[pygame.Surface, int]:
+        '''rendered characters inside the scroll window and the index of the first one, re-rendered only when they change'''
+        start, end = self._get_window()
+        if self._text_surf is None or self._text_range != (start, end):
+            self._text_surf = self.font.render(self.text[start:end], True, COLOR_LABEL)
+            self._text_range = (start, end)
+        return self._text_surf, start
 
     def draw(self, win: pygame.Surface) -> None:
         # Draw background
@@ -136,30 +261,29 @@ class Textbox(GuiElement):
         # Draw border
         pygame.draw.rect(win, COLOR_LABEL, (self.pos, self.get_size()), 1)
 
-        # Draw text
-        text_surf = self.font.render(self.text, True, COLOR_LABEL)
-        text_rect = text_surf.get_rect()
-        text_rect.left = self.pos.x + margin - self.scroll_x
-        text_rect.centery = self.pos.y + self.height / 2
+        # Clip text to textbox
+        previous_clip = win.get_clip()
+        clip_rect = pygame.Rect(self.pos.x + margin, self.pos.y, self.width - 2 * margin, self.height).clip(previous_clip)
+        win.set_clip(clip_rect)
 
         if self.is_focused:
             # Draw selection
             if self.selection_start != self.selection_end:
                 start = min(self.selection_start, self.selection_end)
                 end = max(self.selection_start, self.selection_end)
-                start_x = self.font.size(self.text[:start])[0] - self.scroll_x + self.pos.x + margin
-                end_x = self.font.size(self.text[:end])[0] - self.scroll_x + self.pos.x + margin
+                start_x = self.get_text_x(start) - self.scroll_x + self.pos.x + margin
+                end_x = self.get_text_x(end) - self.scroll_x + self.pos.x + margin
                 pygame.draw.rect(win, COLOR_SELECTED, (start_x, self.pos.y + margin, end_x - start_x, self.height - 2 * margin))
 
             # Draw cursor
             if self.cursor_blink_timer % 60 < 30:  # Blink every 30 frames
-                cursor_x = self.font.size(self.text[:self.cursor_pos])[0] - self.scroll_x + self.pos.x + margin
+                cursor_x = self.get_text_x(self.cursor_pos) - self.scroll_x + self.pos.x + margin
                 pygame.draw.line(win, COLOR_LABEL, (cursor_x, self.pos.y + margin), (cursor_x, self.pos.y + self.height - margin))
 
-        # Clip text to textbox
-        clip_rect = pygame.Rect(self.pos.x + margin, self.pos.y, self.width - 2 * margin, self.height)
-        win.set_clip(clip_rect)
+        # Draw text, only the characters inside the window are rendered
+        text_surf, first = self._get_visible_text()
+        text_rect = text_surf.get_rect()
+        text_rect.left = self.pos.x + margin + self._offsets[first] - self.scroll_x
+        text_rect.centery = self.pos.y + self.height / 2
         win.blit(text_surf, text_rect)
-        win.set_clip(None)
-
-        
\ No newline at end of file
+        win.set_clip(previous_clip)
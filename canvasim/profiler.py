@@ -0,0 +1,199 @@
+
+'''
+Frame profiler for the canvas and gui main loops.
+Phases and counters of each frame are kept in a ring buffer, shown in an optional HUD and exported as JSON or Chrome trace.
+Disabled by default, instrumented code then only pays for an attribute check.
+'''
+
+from collections import deque
+from dataclasses import dataclass, field
+import json
+import time
+
+import pygame
+
+HUD_BACK_COLOR = (0, 0, 0, 170)
+HUD_TEXT_COLOR = (230, 230, 230)
+HUD_WIDTH = 280
+
+
+@dataclass
+class FrameRecord:
+    start: float
+    duration: float = 0.0
+    # (name, start, duration, depth), times in seconds
+    phases: list[tuple[str, float, float, int]] = field(default_factory=list)
+    counters: dict[str, int] = field(default_factory=dict)
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler = self.profiler
+        profiler._depth -= 1
+        if profiler._current is not None:
+            profiler._current.phases.append((self.name, self.start, end - self.start, profiler._depth))
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_phase = _NullPhase()
+
+
+class Profiler:
+    """Records per-phase timings and counters of the last frames"""
+    def __init__(self, capacity: int = 600):
+        self.enabled = False
+        self.show_hud = False
+        self.frames: deque[FrameRecord] = deque(maxlen=capacity)
+        self.hud_rect: pygame.Rect = None
+        self._origin = time.perf_counter()
+        self._current: FrameRecord = None
+        self._depth = 0
+        self._font: pygame.Font = None
+
+    def enable(self, show_hud: bool = False) -> None:
+        self.enabled = True
+        self.show_hud = show_hud
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.show_hud = False
+        self._current = None
+        self._depth = 0
+
+    def toggle(self) -> None:
+        '''cycles off -> recording with hud -> off'''
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable(show_hud=True)
+
+    def clear(self) -> None:
+        self.frames.clear()
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+        self._current = FrameRecord(time.perf_counter())
+        self._depth = 0
+
+    def end_frame(self) -> None:
+        if self._current is None:
+            return
+        self._current.duration = time.perf_counter() - self._current.start
+        self.frames.append(self._current)
+        self._current = None
+
+    def phase(self, name: str):
+        '''context manager timing a phase of the current frame, a shared no-op when disabled'''
+        if self._current is None:
+            return _null_phase
+        return _Phase(self, name)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        current = self._current
+        if current is None:
+            return
+        current.counters[name] = current.counters.get(name, 0) + amount
+
+    def get_summary(self, frames: int = 60) -> dict:
+        '''average frame time, per-phase milliseconds and counters over the last frames'''
+        recent = list(self.frames)[-frames:]
+        if not recent:
+            return {'frames': 0, 'frame_ms': 0.0, 'phases': {}, 'counters': {}}
+        phases: dict[str, float] = {}
+        counters: dict[str, float] = {}
+        for frame in recent:
+            for name, _, duration, _ in frame.phases:
+                phases[name] = phases.get(name, 0.0) + duration
+            for name, amount in frame.counters.items():
+                counters[name] = counters.get(name, 0) + amount
+        count = len(recent)
+        return {
+            'frames': count,
+            'frame_ms': sum(frame.duration for frame in recent) / count * 1000,
+            'phases': {name: total / count * 1000 for name, total in phases.items()},
+            'counters': {name: total / count for name, total in counters.items()},
+        }
+
+    def export_json(self, path: str) -> None:
+        '''writes every recorded frame, times in milliseconds from the profiler creation'''
+        frames = [
+            {
+                'start_ms': (frame.start - self._origin) * 1000,
+                'duration_ms': frame.duration * 1000,
+                'phases': [
+                    {'name': name, 'start_ms': (start - self._origin) * 1000, 'duration_ms': duration * 1000, 'depth': depth}
+                    for name, start, duration, depth in frame.phases
+                ],
+                'counters': frame.counters,
+            }
+            for frame in self.frames
+        ]
+        with open(path, 'w') as file:
+            json.dump({'frames': frames, 'summary': self.get_summary(len(self.frames))}, file, indent=2)
+
+    def export_chrome_trace(self, path: str) -> None:
+        '''writes the recorded frames in the trace event format read by chrome://tracing and Perfetto'''
+        events = []
+        for frame in self.frames:
+            ts = (frame.start - self._origin) * 1e6
+            events.append({'name': 'frame', 'ph': 'X', 'ts': ts, 'dur': frame.duration * 1e6, 'pid': 0, 'tid': 0})
+            for name, start, duration, _ in frame.phases:
+                events.append({'name': name, 'ph': 'X', 'ts': (start - self._origin) * 1e6, 'dur': duration * 1e6, 'pid': 0, 'tid': 0})
+            if frame.counters:
+                events.append({'name': 'counters', 'ph': 'C', 'ts': ts, 'args': frame.counters, 'pid': 0, 'tid': 0})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def get_hud_lines(self) -> list[str]:
+        summary = self.get_summary()
+        frame_ms = summary['frame_ms']
+        lines = [f'frame {frame_ms:6.2f} ms  {1000 / frame_ms if frame_ms else 0:5.0f} fps']
+        for name, ms in summary['phases'].items():
+            lines.append(f'{name:<18}{ms:7.2f} ms')
+        counters = summary['counters']
+        for name, amount in counters.items():
+            lines.append(f'{name:<18}{amount:9.1f}')
+        hits = counters.get('scale_cache_hits', 0)
+        misses = counters.get('scale_cache_misses', 0)
+        if hits + misses:
+            lines.append(f'{"scale_cache_rate":<18}{hits / (hits + misses) * 100:8.1f}%')
+        return lines
+
+    def draw_hud(self, win: pygame.Surface, pos: tuple[int, int] = (8, 24)) -> pygame.Rect:
+        '''draws the summary of the last frames, returns the covered rect'''
+        if self._font is None:
+            self._font = pygame.font.SysFont('consolas', 12)
+        lines = self.get_hud_lines()
+        line_height = self._font.get_linesize()
+        back = pygame.Surface((HUD_WIDTH, line_height * len(lines) + 8), pygame.SRCALPHA)
+        back.fill(HUD_BACK_COLOR)
+        for i, line in enumerate(lines):
+            back.blit(self._font.render(line, True, HUD_TEXT_COLOR), (4, 4 + i * line_height))
+        self.hud_rect = win.blit(back, pos)
+        return self.hud_rect
+
+
+profiler = Profiler()
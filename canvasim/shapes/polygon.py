@@ -1,23 +1,150 @@
 
 
+from array import array
+from collections.abc import Sequence
+
 import pygame
 from pygame import Vector2
 
-from ..canvas import Element, Transformation, Handle
+from ..canvas import Element, Transformation, PointGrid
+
+
+class VertexHandle:
+    """Lightweight handle viewing one vertex in the coordinate array of its owner polygon.
+    Views are created on access, two views of the same vertex compare equal"""
+    __slots__ = ('owner', 'index')
+
+    def __init__(self, owner: 'Polygon', index: int):
+        self.owner = owner
+        self.index = index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, VertexHandle) and other.owner is self.owner and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.owner), self.index))
+
+    @property
+    def radius(self) -> float:
+        return self.owner.handle_radius
+
+    @property
+    def pos(self) -> Vector2:
+        coords = self.owner.coords
+        return Vector2(coords[self.index * 2], coords[self.index * 2 + 1])
+
+    @property
+    def transformation(self) -> Transformation:
+        '''a copy of the vertex position, use set_pos to move it'''
+        return Transformation(self.pos)
+
+    def hit_test(self, world_pos: Vector2) -> bool:
+        coords = self.owner.coords
+        dx = world_pos[0] - coords[self.index * 2]
+        dy = world_pos[1] - coords[self.index * 2 + 1]
+        return dx * dx + dy * dy < self.radius * self.radius
+
+    def set_pos(self, pos: Vector2) -> None:
+        self.owner.set_point(self.index, pos)
+
+    def get_screen_rect(self, transform: Transformation) -> pygame.Rect:
+        screen_pos = (self.pos - transform.pos) * transform.scale
+        radius = self.radius * transform.scale
+        return pygame.Rect(screen_pos.x - radius, screen_pos.y - radius, radius * 2, radius * 2).inflate(4, 4)
+
+    def draw(self, win: pygame.Surface, transform: Transformation) -> None:
+        screen_pos = (self.pos - transform.pos) * transform.scale
+        pygame.draw.circle(win, (255, 255, 255), screen_pos, self.radius * transform.scale, 1)
+
+
+class VertexHandles(Sequence):
+    """Read-only sequence of the vertex handles of a polygon, a handle view is created only when accessed"""
+    __slots__ = ('owner',)
+
+    def __init__(self, owner: 'Polygon'):
+        self.owner = owner
+
+    def __len__(self) -> int:
+        return len(self.owner)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [VertexHandle(self.owner, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('vertex index out of range')
+        return VertexHandle(self.owner, index)
+
 
 class Polygon(Element):
+    """Filled polygon, vertices are kept in one packed coordinate array and found for picking through a
+    vertex grid, so there is no Python object or handle index entry per vertex"""
+    __slots__ = ('coords', 'color', '_bounds', '_vertex_grid')
+    lazy_handles = True
+    handle_radius = 10
+
     def __init__(self, color: pygame.Color, points: list[Vector2]):
         super().__init__()
-        self.points = [Transformation(point) for point in points]
-        self.handles = [Handle(point, 10, self) for point in self.points]
+        # vertices packed as x0, y0, x1, y1, ...
+        self.coords = array('d')
+        for point in points:
+            self.coords.extend((point[0], point[1]))
+        self.handles = VertexHandles(self)
         self.color = color
+        self._bounds: pygame.FRect = None
+        # built on the first handle query
+        self._vertex_grid: PointGrid = None
+
+    @classmethod
+    def from_coords(cls, color: pygame.Color, coords: array) -> 'Polygon':
+        '''creates a polygon owning coords, an array('d') of packed x, y pairs'''
+        polygon = cls(color, [])
+        polygon.coords = coords
+        return polygon
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    @property
+    def points(self) -> list[Vector2]:
+        '''copies of the vertex positions'''
+        return [self.get_point(i) for i in range(len(self))]
+
+    def get_point(self, index: int) -> Vector2:
+        index %= len(self)
+        return Vector2(self.coords[index * 2], self.coords[index * 2 + 1])
+
+    def query_handles(self, rect: pygame.FRect) -> list[VertexHandle]:
+        if self._vertex_grid is None:
+            self._vertex_grid = PointGrid(self.coords)
+        return [VertexHandle(self, index) for index in self._vertex_grid.query_rect(rect)]
     
     def add_point(self, point: Vector2) -> None:
-        point_transform = Transformation(point)
-        self.points.append(point_transform)
-        self.handles.append(Handle(point_transform, 10, self))
+        self.coords.extend((point[0], point[1]))
+        if self._vertex_grid is not None:
+            self._vertex_grid.insert(len(self) - 1)
+        self._bounds = None
+        self.mark_dirty()
+
+    def set_point(self, index: int, pos: Vector2) -> None:
+        if self._vertex_grid is not None:
+            self._vertex_grid.move(index, pos[0], pos[1])
+        self.coords[index * 2] = pos[0]
+        self.coords[index * 2 + 1] = pos[1]
+        self._bounds = None
+        self.mark_dirty()
+
+    def get_world_bounds(self) -> pygame.FRect:
+        if not self.coords:
+            return None
+        if self._bounds is None:
+            xs = self.coords[0::2]
+            ys = self.coords[1::2]
+            self._bounds = pygame.FRect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+        return self._bounds
 
     def draw(self, win: pygame.Surface, transform: Transformation) -> None:
-        if len(self.points) < 3:
+        if len(self) < 3:
             return
-        pygame.draw.polygon(win, self.color, [transform.transform(point).pos for point in self.points])
\ No newline at end of file
+        pygame.draw.polygon(win, self.color, transform.transform_coords(self.coords))
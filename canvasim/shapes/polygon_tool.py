@@ -11,7 +11,7 @@ class PolygonTool(EditTool):
     def __init__(self, context):
         super().__init__(context)
         self.polygon = Polygon((255, 255, 255), [])
-        self.viewport.database.elements.append(self.polygon)
+        self.viewport.database.add_element(self.polygon)
 
     def handle_mouse_down(self, event) -> 'EditTool':
         mouse_pos = event.pos
@@ -24,9 +24,22 @@ class PolygonTool(EditTool):
             return None
         return self
 
+    def get_overlay_points(self, transform: Transformation) -> list[Vector2]:
+        points = [Vector2(point) for point in transform.transform_points([self.polygon.get_point(-1), self.polygon.get_point(0)])]
+        points.append(Vector2(pygame.mouse.get_pos()))
+        return points
+
     def draw(self, win: pygame.Surface, transform: Transformation) -> None:
-        if len(self.polygon.points) < 2:
+        if len(self.polygon) < 2:
             return
-        points = [transform.transform(point).pos for point in [self.polygon.points[-1], self.polygon.points[0]]]
-        points.append(Vector2(pygame.mouse.get_pos()))
-        pygame.draw.polygon(win, (255, 255, 255), points, 1)
+        pygame.draw.polygon(win, (255, 255, 255), self.get_overlay_points(transform), 1)
+
+    def get_dirty_rects(self, transform: Transformation) -> list[pygame.Rect]:
+        if len(self.polygon) < 2:
+            return []
+        points = self.get_overlay_points(transform)
+        left = min(point.x for point in points)
+        top = min(point.y for point in points)
+        right = max(point.x for point in points)
+        bottom = max(point.y for point in points)
+        return [pygame.Rect(left, top, right - left, bottom - top).inflate(4, 4)]
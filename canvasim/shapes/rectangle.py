@@ -7,18 +7,28 @@ from pygame import Vector2
 from ..canvas import Element, Transformation, Handle
 
 class Rectangle(Element):
-    def __init__(self, color: pygame.Color, point1: Vector2, point2: Vector2):
+    __slots__ = ('size', 'color')
+
+    def __init__(self, color: pygame.Color, point1: Vector2, point2: Vector2 = None, size: Vector2 = None):
+        """point1 and point2 are opposite corners, or point1 is the top-left corner when the size is given"""
         super().__init__()
 
-        pos = Vector2(min([point1, point2], key=lambda x: x[0]), min([point1, point2], key=lambda x: x[1]))
-        self.size = Vector2(abs(point1[0] - point2[0]), abs(point1[1] - point2[1]))
-        self.transformation = Transformation(pos)
+        if size is None:
+            pos = Vector2(min([point1, point2], key=lambda x: x[0]), min([point1, point2], key=lambda x: x[1]))
+            size = (abs(point1[0] - point2[0]), abs(point1[1] - point2[1]))
+        else:
+            pos = point1
+        self.size = Vector2(size)
+        self.transformation = Transformation(Vector2(pos))
         self.color = color
     
     def get_rect(self, transform: Transformation) -> pygame.Rect:
         pos = transform.transform(self.transformation).pos
         return pygame.Rect(pos, self.size * transform.scale)
 
+    def get_world_bounds(self) -> pygame.FRect:
+        return pygame.FRect(self.transformation.pos, self.size)
+
     def hit_test(self, world_pos: Vector2) -> bool:
         rect = self.get_rect(Transformation(Vector2()))
         return rect.collidepoint(world_pos)
@@ -6,6 +6,7 @@ import pygame
 from pygame import Vector2
 
 from canvasim.canvas import WorldCanvas
+from canvasim.event_utils import coalesce_motion
 from canvasim.canvas import RectanglarSurfElement, TokenElement
 from canvasim.shapes import Polygon, PolygonTool, Rectangle
 from canvasim.gui import GuiContext, Label, Button, ToggleButton
@@ -22,11 +23,11 @@ def main():
     context.assign_tool(pygame.K_p, PolygonTool)
 
     elements = [
-        RectanglarSurfElement(pygame.image.load(image_background)),
+        RectanglarSurfElement.from_asset(image_background),
     ]
 
     for _ in range(10):
-        elements.append(token := TokenElement(pygame.image.load(image_token)))
+        elements.append(token := TokenElement.from_asset(image_token))
         token.transformation.pos = Vector2(randint(0, width), randint(0, height))
 
     elements.append(Polygon((255, 255, 255), [
@@ -52,7 +53,10 @@ def main():
 
     done = False
     while not done:
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if not context.tool.raw_motion:
+            events = coalesce_motion(events)
+        for event in events:
             event_handled = False
             gui_context.handle_event(event)
             for event in gui_context.get_gui_events():